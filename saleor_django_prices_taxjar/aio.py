@@ -0,0 +1,155 @@
+import asyncio
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    from asgiref.sync import sync_to_async
+except ImportError:
+    sync_to_async = None
+
+from . import instrumentation
+from .cache import quote_cache
+from .canonical import TaxRequest
+from .rates import DEFAULT_API_URL, get_api_headers
+from .transport import CircuitOpenError, breaker, get_timeout
+from .utils import QuotedTax, get_cart_tax_items, get_fallback_tax
+
+DEFAULT_ASYNC_CONCURRENCY = 4
+
+
+async def run_sync(func, *args):
+    """Run blocking code, such as ORM queries, off the event loop."""
+    if sync_to_async is not None:
+        return await sync_to_async(func)(*args)
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, lambda: func(*args))
+
+
+class AsyncTaxJarClient(object):
+    """
+    Fetch order tax quotes from TaxJar with aiohttp.
+
+    At most `concurrency` requests are in flight at a time. Quotes are read
+    from and stored in the same cache as the blocking client, so either can
+    reuse the other's results. Use as an async context manager, or call
+    `close` when done.
+
+    """
+    def __init__(self, api_url=None, concurrency=None, session=None):
+        if aiohttp is None:
+            raise ImproperlyConfigured(
+                'aiohttp is required for the asyncio TaxJar client.')
+        self.api_url = (
+            api_url or getattr(settings, 'TAXJAR_API_URL', '') or
+            DEFAULT_API_URL)
+        self.concurrency = concurrency or getattr(
+            settings, 'TAXJAR_ASYNC_CONCURRENCY', DEFAULT_ASYNC_CONCURRENCY)
+        self._session = session
+        self._semaphore = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            connect_timeout, read_timeout = get_timeout()
+            self._session = aiohttp.ClientSession(
+                headers=get_api_headers(),
+                timeout=aiohttp.ClientTimeout(
+                    connect=connect_timeout, sock_read=read_timeout),
+                connector=aiohttp.TCPConnector(limit=self.concurrency))
+        return self._session
+
+    @property
+    def semaphore(self):
+        # Created lazily so that it belongs to the running event loop.
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def get_quote(self, tax_request):
+        """Return a `QuotedTax` for a `canonical.TaxRequest`."""
+        key = tax_request.fingerprint()
+        # The cache may be a network or file backed Django cache.
+        tax = await run_sync(quote_cache.get, key)
+        if tax is not None:
+            return tax
+        if not breaker.allow():
+            raise CircuitOpenError('TaxJar circuit is open')
+        try:
+            async with self.semaphore:
+                with instrumentation.timer(
+                        'taxjar_request', endpoint='taxes'):
+                    async with self.session.post(
+                            self.api_url + '/v2/taxes',
+                            json=tax_request.to_api_payload()) as response:
+                        response.raise_for_status()
+                        data = await response.json()
+        except aiohttp.ClientResponseError as e:
+            if e.status >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        tax = QuotedTax.from_response(data['tax'])
+        await run_sync(quote_cache.set, key, tax)
+        return tax
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+async def aget_taxes_for_cart_full(cart, shipping_costs, discounts,
+                                   client=None, call_site=None):
+    """
+    Return the tax for a cart or order for each of `shipping_costs`.
+
+    The quotes are fetched concurrently, e.g. to compare shipping methods.
+    Quotes that fail fall back to the region's summary rate, as in
+    `utils.get_taxes_for_cart_full`.
+    """
+    address = cart.shipping_address
+    amount, line_items = await run_sync(get_cart_tax_items, cart, discounts)
+    tax_requests = [
+        TaxRequest.build(
+            address, shipping_cost.gross, amount=amount,
+            line_items=line_items)
+        for shipping_cost in shipping_costs]
+    own_client = client is None
+    if own_client:
+        client = AsyncTaxJarClient()
+    try:
+        with instrumentation.call_site(
+                call_site or instrumentation.get_call_site()):
+            results = await asyncio.gather(
+                *[client.get_quote(tax_request)
+                  for tax_request in tax_requests],
+                return_exceptions=True)
+    finally:
+        if own_client:
+            await client.close()
+    taxes = []
+    for result in results:
+        if isinstance(result, (CircuitOpenError, aiohttp.ClientError,
+                               asyncio.TimeoutError)):
+            result = await run_sync(get_fallback_tax, address)
+        elif isinstance(result, BaseException):
+            raise result
+        taxes.append(result)
+    return taxes
@@ -1,5 +1,6 @@
 from django.apps import AppConfig
 from django.conf import settings
+from django.db.models.signals import post_delete, post_save
 
 
 class SaleorDjangoPricesTaxjarConfig(AppConfig):
@@ -8,5 +9,17 @@ class SaleorDjangoPricesTaxjarConfig(AppConfig):
     def ready(self):
         # from . import monkeypatch_tests
         from . import monkeypatches
+        from django_prices_taxjar.models import TaxCategories
+        from saleor.checkout.models import CartLine
+        from .utils import clear_cart_totals, clear_tax_rate_types_cache
+        post_save.connect(clear_tax_rate_types_cache, sender=TaxCategories)
+        post_delete.connect(clear_tax_rate_types_cache, sender=TaxCategories)
+        post_save.connect(clear_cart_totals, sender=CartLine)
+        post_delete.connect(clear_cart_totals, sender=CartLine)
         if getattr(settings, 'TAXJAR_SYNC_ORDERS', False):
             from . import signals
+        if getattr(settings, 'TAXJAR_PREFETCH_QUOTES', False):
+            from . import prefetch
+        if getattr(settings, 'TAXJAR_WARM_UP', False):
+            from .warmup import warm_up
+            warm_up()
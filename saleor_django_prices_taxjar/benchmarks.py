@@ -0,0 +1,216 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from django_countries.fields import Country
+
+from prices import Money
+
+pytest.importorskip('pytest_benchmark')
+
+from saleor.order.models import Order, PaymentStatus  # noqa: E402
+
+from . import geoip, middleware, monkeypatches, signals  # noqa: E402
+from .listing import get_taxed_prices  # noqa: E402
+from .cache import quote_cache, rate_cache  # noqa: E402
+from .sync import (  # noqa: E402
+    enqueue_order_sync, process_pending_operations)
+from .testing import (  # noqa: E402
+    add_order_lines, count_queries, create_variants)
+from .utils import CART_TOTALS_ATTR  # noqa: E402
+
+# Run from the Saleor project with pytest-benchmark installed:
+#   pytest saleor-django-prices-taxjar/saleor_django_prices_taxjar/benchmarks.py
+# Every benchmark records the number of queries and TaxJar calls made by a
+# single run in its extra info, next to the timings. The query count tests
+# are in test_queries.py.
+
+CART_SIZES = [1, 10, 100, 1000]
+
+
+def clear_caches():
+    quote_cache.clear()
+    rate_cache.clear()
+
+
+def run_benchmark(benchmark, fake, func, setup=clear_caches):
+    """Benchmark `func`, recording queries and TaxJar calls of one run."""
+    setup()
+    fake.reset()
+    benchmark.extra_info['queries'] = count_queries(func)
+    benchmark.extra_info['taxjar_calls'] = fake.call_count
+    benchmark.pedantic(func, setup=setup, rounds=5, iterations=1)
+
+
+@pytest.mark.parametrize('size', CART_SIZES)
+def test_cart_get_total(benchmark, fake_taxjar, cart, address, product, size):
+    cart.shipping_address = address
+    cart.save()
+    for variant in create_variants(product, size):
+        cart.lines.create(variant=variant, quantity=1)
+
+    def setup():
+        clear_caches()
+        cart.__dict__.pop(CART_TOTALS_ATTR, None)
+
+    run_benchmark(
+        benchmark, fake_taxjar, lambda: cart.get_total(), setup=setup)
+
+
+@pytest.mark.parametrize('size', CART_SIZES)
+def test_recalculate_order(
+        benchmark, fake_taxjar, shipped_order, product, size):
+    add_order_lines(shipped_order, create_variants(product, size))
+    run_benchmark(
+        benchmark, fake_taxjar,
+        lambda: monkeypatches.recalculate_order(shipped_order))
+
+
+@pytest.mark.parametrize('size', CART_SIZES)
+def test_update_order_prices(
+        benchmark, fake_taxjar, shipped_order, product, size):
+    add_order_lines(shipped_order, create_variants(product, size))
+    run_benchmark(
+        benchmark, fake_taxjar,
+        lambda: monkeypatches.update_order_prices(shipped_order, None))
+
+
+@pytest.mark.parametrize('size', CART_SIZES)
+def test_add_variant_to_order(
+        benchmark, fake_taxjar, shipped_order, product, size):
+    variants = create_variants(product, size)
+
+    def add_variants():
+        shipped_order.lines.all().delete()
+        for variant in variants:
+            monkeypatches.add_variant_to_order(shipped_order, variant, 1)
+
+    run_benchmark(benchmark, fake_taxjar, add_variants)
+
+
+@pytest.mark.parametrize('size', CART_SIZES)
+def test_add_variants_to_order(
+        benchmark, fake_taxjar, shipped_order, product, size):
+    variants = create_variants(product, size)
+
+    def add_variants():
+        shipped_order.lines.all().delete()
+        monkeypatches.add_variants_to_order(
+            shipped_order, [(variant, 1) for variant in variants])
+
+    run_benchmark(benchmark, fake_taxjar, add_variants)
+
+
+def test_region_middleware(benchmark, fake_taxjar, rf):
+    get_response = middleware.region(lambda request: request.region)
+
+    def handle_request():
+        request = rf.get('/', REMOTE_ADDR='8.8.8.8')
+        request.country = 'US'
+        return bool(get_response(request))
+
+    run_benchmark(benchmark, fake_taxjar, handle_request)
+
+
+def test_taxes_middleware(benchmark, fake_taxjar, rf):
+    get_response = middleware.taxes(lambda request: request.taxes)
+
+    def handle_request():
+        request = rf.get('/')
+        request.country = Country('US')
+        request.region = 'CA'
+        return bool(get_response(request))
+
+    run_benchmark(benchmark, fake_taxjar, handle_request)
+
+
+@pytest.mark.parametrize('size', CART_SIZES)
+def test_taxed_prices(benchmark, fake_taxjar, size):
+    prices = [Money(i + 1, 'USD') for i in range(size)]
+    run_benchmark(
+        benchmark, fake_taxjar,
+        lambda: get_taxed_prices(prices, Country('US'), 'CA'))
+
+
+@pytest.mark.parametrize('size', CART_SIZES)
+def test_order_sync_signal(
+        benchmark, fake_taxjar, shipped_order, product, size):
+    add_order_lines(shipped_order, create_variants(product, size))
+    monkeypatches.recalculate_order(shipped_order)
+    shipped_order.payments.create(
+        variant='default', status=PaymentStatus.CONFIRMED,
+        total=shipped_order.total.gross.amount,
+        currency=shipped_order.total.gross.currency)
+
+    def save_order():
+        # Change a tax relevant field so that the sync isn't skipped.
+        shipped_order.created = shipped_order.created.replace(
+            microsecond=(shipped_order.created.microsecond + 1) % 1000000)
+        signals.handle_order_save(Order, shipped_order)
+
+    run_benchmark(benchmark, fake_taxjar, save_order)
+
+
+@pytest.mark.parametrize('size', CART_SIZES)
+def test_sync_worker(benchmark, fake_taxjar, address, size):
+    orders = [
+        Order.objects.create(
+            shipping_address=address, billing_address=address,
+            user_email='benchmark-%d@example.com' % (i,))
+        for i in range(size)]
+
+    def queue_orders():
+        for order in orders:
+            order.created = order.created.replace(
+                microsecond=(order.created.microsecond + 1) % 1000000)
+            enqueue_order_sync(order)
+
+    run_benchmark(
+        benchmark, fake_taxjar, lambda: process_pending_operations(size),
+        setup=queue_orders)
+
+
+def get_rss_kb():
+    """Return the current resident set size of this process."""
+    with open('/proc/self/statm') as statm:
+        resident_pages = int(statm.read().split()[1])
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+def get_import_times(modules):
+    """
+    Return the cumulative import time in seconds of `modules`.
+
+    Django is set up in a fresh interpreter, so the app and its modules are
+    imported from scratch, as in a new worker.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         'import django; django.setup()'],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() in modules:
+            times[parts[2].strip()] = int(parts[1]) / 1000000
+    return times
+
+
+def test_geoip_reader(benchmark):
+    """Time importing and opening the GeoIP database and record its RSS."""
+    package = __name__.rpartition('.')[0]
+    for module, seconds in get_import_times(
+            [package + '.geoip', package + '.utils']).items():
+        benchmark.extra_info[
+            'import_seconds_' + module.rpartition('.')[2]] = seconds
+    rss_before = get_rss_kb()
+    start = time.monotonic()
+    reader = geoip.open_reader()
+    reader.get('8.8.8.8')
+    benchmark.extra_info['open_seconds'] = time.monotonic() - start
+    benchmark.extra_info['rss_increase_kb'] = get_rss_kb() - rss_before
+    benchmark(lambda: geoip.open_reader().get('8.8.8.8'))
@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+DEFAULT_QUOTE_CACHE_SIZE = 1024
+DEFAULT_QUOTE_CACHE_TTL = 300
+QUOTE_CACHE_KEY_PREFIX = 'taxjar-quote:'
+DEFAULT_RATE_CACHE_SIZE = 256
+DEFAULT_RATE_CACHE_TTL = 300
+RATE_CACHE_KEY_PREFIX = 'taxjar-rate:'
+
+
+class TaxQuoteCache(object):
+    """
+    Cache TaxJar quotes keyed on a fingerprint of the request.
+
+    Entries live in a process-local LRU map and expire after `ttl` seconds.
+    If `alias` names a Django cache, entries are also written there so that
+    workers can share quotes; values stored that way must be picklable.
+
+    """
+    def __init__(self, maxsize=DEFAULT_QUOTE_CACHE_SIZE,
+                 ttl=DEFAULT_QUOTE_CACHE_TTL, alias=None,
+                 key_prefix=QUOTE_CACHE_KEY_PREFIX):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.alias = alias
+        self.key_prefix = key_prefix
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self.alias is None:
+            return None
+        return caches[self.alias]
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+        backend = self.backend
+        if backend is not None:
+            value = backend.get(self.key_prefix + key)
+            if value is not None:
+                self._store(key, value, now)
+                with self._lock:
+                    self.hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def set(self, key, value):
+        self._store(key, value, time.monotonic())
+        backend = self.backend
+        if backend is not None:
+            backend.set(self.key_prefix + key, value, self.ttl)
+
+    def get_or_set(self, key, compute):
+        """Return the cached value for `key`, calling `compute` on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'maxsize': self.maxsize}
+
+    def _store(self, key, value, now):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+quote_cache = TaxQuoteCache(
+    maxsize=getattr(
+        settings, 'TAXJAR_QUOTE_CACHE_SIZE', DEFAULT_QUOTE_CACHE_SIZE),
+    ttl=getattr(settings, 'TAXJAR_QUOTE_CACHE_TTL', DEFAULT_QUOTE_CACHE_TTL),
+    alias=getattr(settings, 'TAXJAR_QUOTE_CACHE_ALIAS', None))
+
+# Summary rates per (country, region), as returned by TaxJar.
+rate_cache = TaxQuoteCache(
+    maxsize=getattr(
+        settings, 'TAXJAR_RATE_CACHE_SIZE', DEFAULT_RATE_CACHE_SIZE),
+    ttl=getattr(settings, 'TAXJAR_RATE_CACHE_TTL', DEFAULT_RATE_CACHE_TTL),
+    alias=getattr(settings, 'TAXJAR_RATE_CACHE_ALIAS', None),
+    key_prefix=RATE_CACHE_KEY_PREFIX)
+
+
+class TaxScope(object):
+    """Memo of tax lookups computed within a single unit of work."""
+    def __init__(self):
+        self._values = {}
+
+    def get_or_set(self, key, compute):
+        try:
+            return self._values[key]
+        except KeyError:
+            value = self._values[key] = compute()
+            return value
+
+
+_scopes = threading.local()
+
+
+def get_current_scope():
+    """Return the active `TaxScope` or None."""
+    return getattr(_scopes, 'current', None)
+
+
+@contextmanager
+def tax_scope():
+    """
+    Deduplicate tax lookups made inside the block.
+
+    Used by `middleware.tax_scope` for requests; Celery tasks and management
+    commands can wrap their work in it too. Nested blocks share the outermost
+    scope.
+
+    """
+    scope = get_current_scope()
+    if scope is not None:
+        yield scope
+        return
+    scope = _scopes.current = TaxScope()
+    try:
+        yield scope
+    finally:
+        _scopes.current = None
+
+
+def memoize_in_scope(key, compute):
+    """Return `compute()`, reusing the result within the current scope."""
+    scope = get_current_scope()
+    if scope is None:
+        return compute()
+    return scope.get_or_set(key, compute)
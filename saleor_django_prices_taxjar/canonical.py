@@ -0,0 +1,156 @@
+import hashlib
+import json
+from collections import namedtuple
+from decimal import Decimal
+
+
+def canonical_decimal(value):
+    """Return `value` as a Decimal without exponent or trailing zeros."""
+    value = Decimal(value)
+    if value == value.to_integral_value():
+        return value.quantize(Decimal(1))
+    return value.normalize()
+
+
+def _encode(value):
+    if isinstance(value, Decimal):
+        return '{:f}'.format(value)
+    if isinstance(value, tuple):
+        return [_encode(item) for item in value]
+    return value
+
+
+class CanonicalMixin(object):
+    """
+    Serialization for canonical TaxJar requests.
+
+    Amounts are kept as exact Decimals and line items in a fixed order, so
+    equal requests compare, hash and serialize equally and can be used as
+    keys for quote caching and for deduplicating order syncs.
+
+    """
+    __slots__ = ()
+
+    def as_dict(self):
+        """Return a JSON serializable dict with Decimals as strings."""
+        return {
+            name: _encode(value) for name, value in zip(self._fields, self)}
+
+    def to_bytes(self):
+        """Return a compact and stable serialization."""
+        return json.dumps(
+            self.as_dict(), sort_keys=True, separators=(',', ':')).encode(
+                'utf-8')
+
+    def fingerprint(self):
+        return hashlib.sha1(self.to_bytes()).hexdigest()
+
+
+class TaxLine(CanonicalMixin, namedtuple('TaxLine', [
+        'id', 'quantity', 'unit_price', 'product_tax_code', 'discount'])):
+    """A line item of an order tax request."""
+    __slots__ = ()
+
+
+class TaxRequest(CanonicalMixin, namedtuple('TaxRequest', [
+        'currency', 'to_country', 'to_zip', 'to_state', 'to_city',
+        'to_street', 'shipping', 'amount', 'line_items'])):
+    """An order tax quote request."""
+    __slots__ = ()
+
+    @classmethod
+    def build(cls, address, shipping_cost, amount=None, line_items=None):
+        """
+        Build a request for an address, shipping cost and either an amount
+        or `LineItem` arguments as (id, quantity, base price, tax code,
+        discount) tuples.
+        """
+        if line_items is not None:
+            line_items = tuple(sorted(
+                TaxLine(
+                    variant_id, quantity,
+                    canonical_decimal(base_price.amount), tax_code,
+                    canonical_decimal(discount.amount))
+                for variant_id, quantity, base_price, tax_code, discount
+                in line_items))
+        return cls(
+            shipping_cost.currency,
+            address.country.code, address.postal_code,
+            address.country_area, address.city, address.street_address_1,
+            canonical_decimal(shipping_cost.amount),
+            canonical_decimal(amount.amount) if amount is not None else None,
+            line_items)
+
+    def as_dict(self):
+        data = super(TaxRequest, self).as_dict()
+        if self.line_items is not None:
+            data['line_items'] = [line.as_dict() for line in self.line_items]
+        return data
+
+    def to_api_payload(self):
+        """Return the data for TaxJar's taxes endpoint."""
+        data = {
+            'to_country': self.to_country,
+            'to_zip': self.to_zip,
+            'to_state': self.to_state,
+            'to_city': self.to_city,
+            'to_street': self.to_street,
+            'shipping': float(self.shipping),
+        }
+        if self.amount is not None:
+            data['amount'] = float(self.amount)
+        if self.line_items is not None:
+            data['line_items'] = [{
+                'id': str(line.id),
+                'quantity': line.quantity,
+                'unit_price': float(line.unit_price),
+                'product_tax_code': line.product_tax_code,
+                'discount': float(line.discount),
+            } for line in self.line_items]
+        return data
+
+
+ORDER_TRANSACTION_AMOUNT_FIELDS = ('amount', 'shipping', 'sales_tax')
+
+
+class OrderTransaction(CanonicalMixin, namedtuple('OrderTransaction', [
+        'transaction_id', 'transaction_date', 'to_country', 'to_zip',
+        'to_state', 'to_city', 'to_street', 'amount', 'shipping',
+        'sales_tax'])):
+    """A TaxJar order transaction."""
+    __slots__ = ()
+
+    @classmethod
+    def build(cls, order):
+        address = order.shipping_address or order.billing_address
+        if not address:
+            raise ValueError('Order has no address, which is required!')
+        return cls(
+            transaction_id=str(order.id),
+            transaction_date=order.created.isoformat(),
+            to_country=address.country.code,
+            to_zip=address.postal_code,
+            to_state=address.country_area,
+            to_city=address.city,  # optional
+            to_street=address.street_address_1,  # optional
+            # with shipping but without tax
+            amount=canonical_decimal(order.total_net.amount),
+            # without tax
+            shipping=canonical_decimal(order.shipping_price_net.amount),
+            # total tax for order
+            sales_tax=canonical_decimal(order.total.tax.amount))
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a transaction stored with `as_dict`."""
+        values = dict(data)
+        for field in ORDER_TRANSACTION_AMOUNT_FIELDS:
+            values[field] = canonical_decimal(str(values[field]))
+        return cls(**{field: values.get(field) for field in cls._fields})
+
+    def to_api_payload(self):
+        """Return the data for the TaxJar API, which takes JSON numbers."""
+        data = self._asdict()
+        for field in ORDER_TRANSACTION_AMOUNT_FIELDS:
+            data[field] = float(data[field])
+        return dict(data)
@@ -0,0 +1,31 @@
+import pytest
+
+from tests.conftest import *  # noqa: F401,F403 Saleor's fixtures
+
+from .fake_taxjar import FakeTaxJarServer, install_fake_taxjar
+from .testing import FAKE_API_URL
+from .transport import shared_session
+
+
+@pytest.fixture
+def fake_taxjar(settings):
+    settings.TAXJAR_ACCESS_KEY = settings.TAXJAR_ACCESS_KEY or 'fake'
+    settings.TAXJAR_API_URL = FAKE_API_URL
+    fake = install_fake_taxjar(shared_session.session, api_url=FAKE_API_URL)
+    yield fake
+    shared_session.session.adapters.pop(FAKE_API_URL, None)
+
+
+@pytest.fixture
+def fake_taxjar_server(settings):
+    settings.TAXJAR_ACCESS_KEY = settings.TAXJAR_ACCESS_KEY or 'fake'
+    server = FakeTaxJarServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def shipped_order(order, address):
+    order.shipping_address = address
+    order.save()
+    return order
@@ -0,0 +1,202 @@
+import json
+import re
+import threading
+from collections import Counter
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from requests.adapters import BaseAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+
+DEFAULT_FAKE_RATE = Decimal('0.0725')
+ORDER_PATH = re.compile(r'^/v2/transactions/orders/(?P<id>[^/]+)$')
+
+
+def _to_float(value):
+    return float(Decimal(str(value or 0)))
+
+
+class FakeTaxJar(object):
+    """
+    In-memory stand-in for the parts of the TaxJar API used by the adapter.
+
+    Every call is counted in `calls` by (method, path) so benchmarks and
+    tests can assert how many external requests a code path made. The
+    headers of the last request are kept in `last_headers`.
+
+    """
+    def __init__(self, rate=DEFAULT_FAKE_RATE, summary_rates=()):
+        self.rate = rate
+        self.summary_rates = list(summary_rates) or [{
+            'country_code': 'US', 'country': 'United States',
+            'region_code': 'CA', 'region': 'California',
+            'minimum_rate': {'label': 'State Tax', 'rate': 0.065},
+            'average_rate': {'label': 'Tax', 'rate': float(rate)},
+        }]
+        self.orders = {}
+        self.calls = Counter()
+        self.last_headers = CaseInsensitiveDict()
+        self.lock = threading.Lock()
+
+    @property
+    def call_count(self):
+        return sum(self.calls.values())
+
+    def reset(self):
+        with self.lock:
+            self.orders.clear()
+            self.calls.clear()
+            self.last_headers = CaseInsensitiveDict()
+
+    def handle(self, method, path, data, headers=None):
+        """Return (status, response data) for a request."""
+        path = path.rstrip('/')
+        with self.lock:
+            self.last_headers = CaseInsensitiveDict(headers or {})
+            self.calls[(method, ORDER_PATH.sub(
+                '/v2/transactions/orders/<id>', path))] += 1
+            if method == 'POST' and path == '/v2/taxes':
+                return 200, self.get_taxes(data)
+            if method == 'GET' and path == '/v2/summary_rates':
+                return 200, {'summary_rates': self.summary_rates}
+            if method == 'POST' and path == '/v2/transactions/orders':
+                transaction_id = str(data['transaction_id'])
+                if transaction_id in self.orders:
+                    return 422, self.error(422, 'Unprocessable Entity')
+                self.orders[transaction_id] = data
+                return 201, {'order': data}
+            match = ORDER_PATH.match(path)
+            if match:
+                transaction_id = match.group('id')
+                if transaction_id not in self.orders:
+                    return 404, self.error(404, 'Not Found')
+                if method == 'PUT':
+                    self.orders[transaction_id].update(data)
+                if method == 'DELETE':
+                    return 200, {'order': self.orders.pop(transaction_id)}
+                return 200, {'order': self.orders[transaction_id]}
+        return 404, self.error(404, 'Not Found')
+
+    def get_taxes(self, data):
+        line_items = data.get('line_items') or []
+        if line_items:
+            amount = sum(
+                _to_float(line.get('unit_price')) * line.get('quantity', 1) -
+                _to_float(line.get('discount'))
+                for line in line_items)
+        else:
+            amount = _to_float(data.get('amount'))
+        shipping = _to_float(data.get('shipping'))
+        rate = float(self.rate)
+        return {'tax': {
+            'order_total_amount': amount + shipping,
+            'shipping': shipping,
+            'taxable_amount': amount,
+            'amount_to_collect': round(amount * rate, 2),
+            'rate': rate,
+            'has_nexus': True,
+            'freight_taxable': False,
+            'tax_source': 'destination',
+            'breakdown': {
+                'taxable_amount': amount,
+                'tax_collectable': round(amount * rate, 2),
+                'combined_tax_rate': rate,
+                'line_items': [],
+            },
+        }}
+
+    def error(self, status, message):
+        return {'error': message, 'detail': message, 'status': status}
+
+
+class FakeTaxJarAdapter(BaseAdapter):
+    """Requests transport adapter answering from a `FakeTaxJar`."""
+    def __init__(self, fake):
+        super(FakeTaxJarAdapter, self).__init__()
+        self.fake = fake
+
+    def send(self, request, **kwargs):
+        body = request.body or b''
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        data = json.loads(body.decode('utf-8')) if body else {}
+        status, response_data = self.fake.handle(
+            request.method, urlsplit(request.url).path, data,
+            request.headers)
+        response = Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(
+            {'Content-Type': 'application/json'})
+        response.raw = BytesIO(json.dumps(response_data).encode('utf-8'))
+        response.url = request.url
+        response.request = request
+        response.encoding = 'utf-8'
+        return response
+
+    def close(self):
+        pass
+
+
+def install_fake_taxjar(session, fake=None,
+                        api_url='https://api.taxjar.com'):
+    """Route `session`'s requests to `api_url` to a `FakeTaxJar`."""
+    fake = fake or FakeTaxJar()
+    session.mount(api_url, FakeTaxJarAdapter(fake))
+    return fake
+
+
+class FakeTaxJarServer(ThreadingMixIn, HTTPServer):
+    """
+    Local HTTP server answering from a `FakeTaxJar`.
+
+    Point the client at `api_url`, e.g. with `TAXJAR_API_URL` or the
+    `--api-url` option of the management commands.
+
+    """
+    daemon_threads = True
+
+    def __init__(self, fake=None, host='127.0.0.1', port=0):
+        self.fake = fake or FakeTaxJar()
+        HTTPServer.__init__(self, (host, port), FakeTaxJarRequestHandler)
+
+    @property
+    def api_url(self):
+        return 'http://%s:%d' % self.server_address
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeTaxJarRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def handle_method(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        data = json.loads(body.decode('utf-8')) if body else {}
+        status, response_data = self.server.fake.handle(
+            self.command, urlsplit(self.path).path, data,
+            dict(self.headers.items()))
+        content = json.dumps(response_data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_DELETE = handle_method
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,114 @@
+import ipaddress
+import threading
+from functools import lru_cache
+
+import maxminddb
+from geolite2 import geolite2
+
+from django.conf import settings
+
+from . import instrumentation
+
+
+DEFAULT_GEOIP_CACHE_SIZE = 10000
+
+_reader = None
+_reader_lock = threading.Lock()
+
+
+def open_reader():
+    """
+    Open the GeoIP database.
+
+    `TAXJAR_GEOIP_MODE` set to 'mmap' maps the file into memory so that the
+    pages are shared between worker processes, 'memory' loads it into each
+    process. By default the database is opened by geolite2.
+    """
+    mode = getattr(settings, 'TAXJAR_GEOIP_MODE', None)
+    if mode == 'mmap':
+        if getattr(maxminddb, 'extension', None) is not None:
+            mode = maxminddb.MODE_MMAP_EXT
+        else:
+            mode = maxminddb.MODE_MMAP
+    elif mode == 'memory':
+        mode = maxminddb.MODE_MEMORY
+    else:
+        return geolite2.reader()
+    return maxminddb.open_database(geolite2.filename, mode)
+
+
+def get_reader():
+    """Return the GeoIP reader, opening it on first use."""
+    global _reader
+    if _reader is None:
+        with _reader_lock:
+            if _reader is None:
+                _reader = open_reader()
+    return _reader
+
+
+def get_cache_key(ip_address):
+    """
+    Return the key GeoIP lookups for `ip_address` are cached under.
+
+    With `TAXJAR_GEOIP_CACHE_BY_PREFIX` enabled addresses are grouped by their
+    /24 (IPv4) or /48 (IPv6) network.
+    """
+    if not getattr(settings, 'TAXJAR_GEOIP_CACHE_BY_PREFIX', False):
+        return ip_address
+    ip = ipaddress.ip_address(ip_address)
+    prefix = 24 if ip.version == 4 else 48
+    network = ipaddress.ip_network(
+        '%s/%d' % (ip, prefix), strict=False)
+    return str(network.network_address)
+
+
+def get_codes(geo_data):
+    """Return the country and first subdivision ISO codes of a record."""
+    try:
+        return (geo_data['country']['iso_code'],
+                geo_data['subdivisions'][0]['iso_code'])
+    except (KeyError, IndexError, TypeError):
+        return (None, None)
+
+
+@lru_cache(maxsize=getattr(
+    settings, 'TAXJAR_GEOIP_CACHE_SIZE', DEFAULT_GEOIP_CACHE_SIZE))
+def _lookup(cache_key):
+    # Only the two codes are kept, not the decoded record.
+    return get_codes(get_reader().get(cache_key))
+
+
+def get_country_region_by_ip(ip_address):
+    with instrumentation.timer('geoip_lookup'):
+        return _lookup(get_cache_key(ip_address))
+
+
+def get_country_region_by_ips(ip_addresses):
+    """
+    Return a dict of (country, region) codes for many addresses.
+
+    Each distinct address, or network with prefix caching, is only looked up
+    once, which makes this suitable for processing logs.
+    """
+    keys = {}
+    for ip_address in ip_addresses:
+        if ip_address not in keys:
+            keys[ip_address] = get_cache_key(ip_address)
+    codes = {key: _lookup(key) for key in set(keys.values())}
+    return {ip_address: codes[key] for ip_address, key in keys.items()}
+
+
+def cache_stats():
+    info = _lookup.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'maxsize': info.maxsize,
+        'hit_rate': info.hits / lookups if lookups else 0.0}
+
+
+def clear_cache():
+    _lookup.cache_clear()
@@ -0,0 +1,169 @@
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from contextvars import ContextVar
+except ImportError:  # Python < 3.7
+    ContextVar = None
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Collector(object):
+    """Receives metrics reported by the tax adapter; ignores them."""
+    def increment(self, name, value, tags):
+        pass
+
+    def timing(self, name, duration, tags):
+        pass
+
+
+class InMemoryCollector(Collector):
+    """Keep counters and timing summaries in memory, keyed by tags."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.timings = {}
+
+    def increment(self, name, value, tags):
+        key = (name, tuple(sorted(tags.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def timing(self, name, duration, tags):
+        key = (name, tuple(sorted(tags.items())))
+        with self._lock:
+            count, total, maximum = self.timings.get(key, (0, 0.0, 0.0))
+            self.timings[key] = (
+                count + 1, total + duration, max(maximum, duration))
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.timings.clear()
+
+
+def _format_labels(tags):
+    return ','.join('%s="%s"' % (key, value) for key, value in tags)
+
+
+def render_prometheus(collector, prefix='taxjar'):
+    """Render an `InMemoryCollector` in the Prometheus text format."""
+    lines = []
+    with collector._lock:
+        counters = sorted(collector.counters.items())
+        timings = sorted(collector.timings.items())
+    for (name, tags), value in counters:
+        lines.append('%s_%s_total{%s} %s' % (
+            prefix, name, _format_labels(tags), value))
+    for (name, tags), (count, total, maximum) in timings:
+        labels = _format_labels(tags)
+        lines.append('%s_%s_seconds_count{%s} %d' % (
+            prefix, name, labels, count))
+        lines.append('%s_%s_seconds_sum{%s} %f' % (
+            prefix, name, labels, total))
+        lines.append('%s_%s_seconds_max{%s} %f' % (
+            prefix, name, labels, maximum))
+    return '\n'.join(lines) + '\n'
+
+
+class StatsdCollector(Collector):
+    """Send metrics to StatsD over UDP, with DogStatsD style tags."""
+    def __init__(self, host='localhost', port=8125, prefix='taxjar'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def increment(self, name, value, tags):
+        self.send('%s:%s|c' % (name, value), tags)
+
+    def timing(self, name, duration, tags):
+        self.send('%s:%d|ms' % (name, duration * 1000), tags)
+
+    def send(self, metric, tags):
+        data = '%s.%s' % (self.prefix, metric)
+        if tags:
+            data += '|#' + ','.join(
+                '%s:%s' % (key, value) for key, value in sorted(tags.items()))
+        try:
+            self.socket.sendto(data.encode('utf-8'), self.address)
+        except OSError:
+            pass
+
+
+default_collector = InMemoryCollector()
+_collectors = None
+
+
+def get_collectors():
+    """
+    Return the collectors metrics are reported to.
+
+    These are the in-memory `default_collector` and instances of the classes
+    listed by dotted path in `TAXJAR_METRICS_COLLECTORS`.
+    """
+    global _collectors
+    if _collectors is None:
+        _collectors = [default_collector] + [
+            import_string(path)()
+            for path in getattr(settings, 'TAXJAR_METRICS_COLLECTORS', ())]
+    return _collectors
+
+
+# A context variable where available, so that coroutines running
+# concurrently on one event loop each keep their own call site.
+if ContextVar is not None:
+    _call_site = ContextVar('taxjar_call_site', default=None)
+
+    def get_call_site():
+        return _call_site.get()
+
+    def _set_call_site(name):
+        _call_site.set(name)
+else:
+    _context = threading.local()
+
+    def get_call_site():
+        return getattr(_context, 'call_site', None)
+
+    def _set_call_site(name):
+        _context.call_site = name
+
+
+@contextmanager
+def call_site(name):
+    """Tag metrics reported inside the block with the call site `name`."""
+    previous = get_call_site()
+    _set_call_site(name)
+    try:
+        yield
+    finally:
+        _set_call_site(previous)
+
+
+def _get_tags(tags):
+    tags.setdefault('call_site', get_call_site() or 'unknown')
+    return tags
+
+
+def increment(name, value=1, **tags):
+    tags = _get_tags(tags)
+    for collector in get_collectors():
+        collector.increment(name, value, tags)
+
+
+@contextmanager
+def timer(name, **tags):
+    """Count and time the block, tagged with the current call site."""
+    tags = _get_tags(tags)
+    start = time.monotonic()
+    try:
+        yield tags
+    finally:
+        duration = time.monotonic() - start
+        for collector in get_collectors():
+            collector.increment(name, 1, tags)
+            collector.timing(name, duration, tags)
@@ -0,0 +1,91 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from babel.numbers import get_currency_precision
+
+from prices import Money, MoneyRange, TaxedMoney, TaxedMoneyRange
+
+from saleor.core.utils.taxes import DEFAULT_TAX_RATE_NAME
+
+from .utils import QuotedTax, get_taxes_for_country_region
+
+
+def get_rate_from_taxes(taxes, rate_name=DEFAULT_TAX_RATE_NAME):
+    """Return the tax rate of a Saleor taxes dict as a fraction, or None."""
+    if not taxes:
+        return None
+    tax = taxes.get(rate_name) or taxes[DEFAULT_TAX_RATE_NAME]
+    return QuotedTax.from_tax(tax['tax']).rate
+
+
+def _get_moneys(prices):
+    for price in prices:
+        if isinstance(price, MoneyRange):
+            yield price.start
+            yield price.stop
+        elif isinstance(price, Money):
+            yield price
+        else:
+            raise TypeError('Unsupported price %r' % (price,))
+
+
+def apply_rate_to_prices(prices, rate, keep_gross=False):
+    """
+    Return `prices` taxed at `rate`, the same as `flat_tax` would.
+
+    `prices` is a sequence of `Money` and `MoneyRange` values. Ranges come
+    back as `TaxedMoneyRange` and everything else as `TaxedMoney`. The
+    amounts are taxed in one pass, looking up the quantization of each
+    currency once.
+    """
+    prices = list(prices)
+    moneys = list(_get_moneys(prices))
+    if rate is None:
+        taxed = [TaxedMoney(net=money, gross=money) for money in moneys]
+    else:
+        fraction = Decimal(1) + rate
+        exponents = {}
+        for currency in {money.currency for money in moneys}:
+            exponents[currency] = (
+                Decimal('0.1') ** get_currency_precision(currency))
+        if keep_gross:
+            taxed = [
+                TaxedMoney(
+                    net=Money(
+                        (money.amount / fraction).quantize(
+                            exponents[money.currency], ROUND_HALF_UP),
+                        money.currency),
+                    gross=money)
+                for money in moneys]
+        else:
+            taxed = [
+                TaxedMoney(
+                    net=money,
+                    gross=Money(
+                        (money.amount * fraction).quantize(
+                            exponents[money.currency], ROUND_HALF_UP),
+                        money.currency))
+                for money in moneys]
+    taxed = iter(taxed)
+    results = []
+    for price in prices:
+        if isinstance(price, MoneyRange):
+            start = next(taxed)
+            results.append(TaxedMoneyRange(start=start, stop=next(taxed)))
+        else:
+            results.append(next(taxed))
+    return results
+
+
+def get_taxed_prices(prices, country, region=None, keep_gross=False):
+    """
+    Return `prices` taxed at the rate of a country and region.
+
+    The rate is looked up once for the whole sequence, so listing pages
+    don't tax every product separately. Prices are left untaxed if there is
+    no country or TaxJar has no rate for it.
+    """
+    rate = None
+    if country:
+        rate = get_rate_from_taxes(
+            get_taxes_for_country_region(country, region))
+    return apply_rate_to_prices(prices, rate, keep_gross=keep_gross)
@@ -0,0 +1,182 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q, Sum
+
+from taxjar.exceptions import TaxJarResponseError
+
+from saleor.order.models import Order
+
+from ...signals import PAID_PAYMENT_STATUSES
+from ...instrumentation import call_site
+from ...sync import (create_client, get_order_transaction_payload,
+                     get_sync_states, is_payload_synced, mark_order_synced,
+                     sync_order_transaction)
+
+
+# Fields compared by --verify between local payloads and TaxJar records.
+VERIFIED_FIELDS = ('amount', 'shipping', 'sales_tax')
+
+
+class RateLimiter(object):
+    """Space out calls so that at most `rate` happen per second."""
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_call = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_call - now
+            self.next_call = max(now, self.next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def get_paid_orders(start_after=0):
+    """Return paid orders with an address, ordered by primary key."""
+    return Order.objects.annotate(total_paid=Sum(
+        'payments__total',
+        filter=Q(payments__status__in=PAID_PAYMENT_STATUSES))).filter(
+            Q(shipping_address__isnull=False) |
+            Q(billing_address__isnull=False),
+            pk__gt=start_after,
+            total_paid__gte=F('total_gross')).select_related(
+                'shipping_address', 'billing_address').order_by('pk')
+
+
+class Command(BaseCommand):
+    help = (
+        'Push paid orders to TaxJar as transactions, or compare them with '
+        'the transactions recorded in TaxJar.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Report orders missing or different in TaxJar instead of '
+                 'pushing them.')
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Number of concurrent TaxJar requests.')
+        parser.add_argument(
+            '--rate', type=float, default=10,
+            help='Maximum number of TaxJar requests per second.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Number of orders fetched and checkpointed at a time.')
+        parser.add_argument(
+            '--checkpoint',
+            help='File storing the order id up to which every order was '
+                 'processed, used to resume an interrupted run. It stops '
+                 'advancing at the first failed order, so resuming retries '
+                 'it.')
+        parser.add_argument(
+            '--api-url', help='TaxJar API URL, e.g. for a local fake server.')
+
+    def handle(self, *args, **options):
+        self.client = create_client(options['api_url'])
+        self.limiter = RateLimiter(options['rate'])
+        self.verify = options['verify']
+        self.checkpoint_frozen = False
+        checkpoint = options['checkpoint']
+        start_after = self.read_checkpoint(checkpoint)
+        orders = get_paid_orders(start_after).iterator(
+            chunk_size=options['chunk_size'])
+
+        processed = failed = 0
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            chunk = []
+            for order in orders:
+                chunk.append(order)
+                if len(chunk) >= options['chunk_size']:
+                    failed += self.process_chunk(executor, chunk, checkpoint)
+                    processed += len(chunk)
+                    self.report(processed, failed, started)
+                    chunk = []
+            if chunk:
+                failed += self.process_chunk(executor, chunk, checkpoint)
+                processed += len(chunk)
+        self.report(processed, failed, started)
+
+    def process_chunk(self, executor, orders, checkpoint):
+        payloads = [
+            (order.pk, get_order_transaction_payload(order))
+            for order in orders]
+        if self.verify:
+            results = executor.map(
+                lambda args: self.verify_order(*args), payloads)
+        else:
+            states = get_sync_states([order.pk for order in orders])
+            payloads = [
+                (order_id, payload) for order_id, payload in payloads
+                if not is_payload_synced(states.get(order_id), payload)]
+            results = executor.map(
+                lambda args: self.push_order(*args, state=states.get(args[0])),
+                payloads)
+        failed_ids = []
+        for (order_id, payload), error in zip(payloads, results):
+            if error:
+                failed_ids.append(order_id)
+                self.stderr.write('Order #%s: %s' % (order_id, error))
+            elif not self.verify:
+                mark_order_synced(order_id, payload)
+        # Orders are processed in primary key order, so everything before
+        # the first failure is done. Later chunks can't move past it.
+        if not self.checkpoint_frozen:
+            if failed_ids:
+                self.write_checkpoint(checkpoint, min(failed_ids) - 1)
+                self.checkpoint_frozen = True
+            else:
+                self.write_checkpoint(checkpoint, orders[-1].pk)
+        return len(failed_ids)
+
+    def push_order(self, order_id, payload, state=None):
+        self.limiter.wait()
+        try:
+            with call_site('backfill'):
+                sync_order_transaction(
+                    payload, client=self.client,
+                    created=state is not None and state.created_in_taxjar)
+        except Exception as e:
+            return repr(e)
+        return None
+
+    def verify_order(self, order_id, payload):
+        self.limiter.wait()
+        try:
+            remote = self.client.show_order(payload['transaction_id'])
+        except TaxJarResponseError as e:
+            return 'missing in TaxJar (%r)' % (e,)
+        except Exception as e:
+            return repr(e)
+        differences = [
+            '%s: local %s, TaxJar %s' % (
+                field, payload[field], getattr(remote, field, None))
+            for field in VERIFIED_FIELDS
+            if round(float(getattr(remote, field, 0) or 0), 2) !=
+            round(float(payload[field]), 2)]
+        return '; '.join(differences) or None
+
+    def report(self, processed, failed, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write('%d orders, %d failed, %.1f orders/s' % (
+            processed, failed, processed / elapsed if elapsed else 0))
+
+    def read_checkpoint(self, path):
+        if path and os.path.exists(path):
+            with open(path) as f:
+                return int(f.read().strip() or 0)
+        return 0
+
+    def write_checkpoint(self, path, order_id):
+        if not path:
+            return
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(order_id))
+        os.replace(tmp_path, path)
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ...sync import process_pending_operations
+
+
+class Command(BaseCommand):
+    help = 'Sync queued order transactions to TaxJar.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=100,
+            help='Maximum number of queued operations to process per batch.')
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep polling for new operations instead of exiting.')
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Seconds to wait between polls when --loop is used.')
+
+    def handle(self, *args, **options):
+        while True:
+            synced, failed = process_pending_operations(options['limit'])
+            if synced or failed:
+                self.stdout.write(
+                    'Synced %d orders, %d failed.' % (synced, failed))
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
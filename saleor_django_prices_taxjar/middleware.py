@@ -4,41 +4,64 @@ from django.utils.functional import SimpleLazyObject
 
 from saleor.core.utils import get_client_ip
 
-from .utils import get_country_region_by_ip, get_taxes_for_country_region
+from .cache import tax_scope as _tax_scope
+from .instrumentation import call_site
+from .geoip import get_country_region_by_ip
+from .utils import get_taxes_for_country_region
+
+
+def get_request_region(request):
+    """Return the region of the client's IP if it is in `request.country`."""
+    client_ip = get_client_ip(request)
+    if client_ip and request.country:
+        country, region = get_country_region_by_ip(client_ip)
+        # If `request.country` doesn't match the one returned by geolite2,
+        # then the region doesn't exist in the country, so don't set it.
+        if country == request.country:
+            return region
+    return None
 
 
 def region(get_response):
     """
     Detect the user's region and assign it to `request.region`.
 
-    `request.region` will be None if there is no subdivisions[0].iso_code
+    `request.region` is evaluated lazily, so requests that never read it do
+    no GeoIP lookup. It will be None (compare with `==` or test its truth
+    value, as it is a lazy object) if there is no subdivisions[0].iso_code
     returned by geolite2 or if `request.country` is None or the country in
     geolite2's data does not match the current `request.country`.
 
     """
     def middleware(request):
-        client_ip = get_client_ip(request)
-        request.region = None
-        if client_ip and request.country:
-            country, region = get_country_region_by_ip(client_ip)
-            # If `request.country` doesn't match the one returned by geolite2,
-            # then the region doesn't exist in the country, so don't set it.
-            if country == request.country:
-                request.region = region
+        request.region = SimpleLazyObject(lambda: get_request_region(request))
         return get_response(request)
 
     return middleware
 
 
+def get_request_taxes(request):
+    with call_site('middleware'):
+        return get_taxes_for_country_region(request.country, request.region)
+
+
 def taxes(get_response):
     """Assign tax rates for country and region to `request.taxes`."""
     def middleware(request):
         if settings.TAXJAR_ACCESS_KEY:
             request.taxes = SimpleLazyObject(
-                lambda: get_taxes_for_country_region(request.country,
-                                                     request.region))
+                lambda: get_request_taxes(request))
         else:
             request.taxes = None
         return get_response(request)
 
     return middleware
+
+
+def tax_scope(get_response):
+    """Compute each distinct tax lookup at most once per request."""
+    def middleware(request):
+        with _tax_scope():
+            return get_response(request)
+
+    return middleware
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('saleor_django_prices_taxjar', '0002_ordersyncstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ordersyncstate',
+            name='synced_fingerprint',
+            field=models.CharField(blank=True, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='ordersyncstate',
+            name='created_in_taxjar',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('saleor_django_prices_taxjar', '0003_ordersyncstate_synced'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ordersyncoperation',
+            name='claimed_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,61 @@
+from django.contrib.postgres.fields import JSONField
+from django.db import models
+from django.utils import timezone
+
+
+class OrderSyncOperation(models.Model):
+    """
+    A pending sync of an order transaction to TaxJar.
+
+    Rows are written in the same transaction as the order or payment save and
+    drained by `sync.process_pending_operations`. The order is referenced by
+    id rather than a foreign key so that syncs queued from `pre_delete`
+    outlive the order.
+
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_DONE = 'done'
+    STATUS_SUPERSEDED = 'superseded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_SUPERSEDED, 'Superseded'),
+        (STATUS_FAILED, 'Failed'))
+
+    order_id = models.PositiveIntegerField(db_index=True)
+    payload = JSONField()
+    status = models.CharField(
+        max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    claimed_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    processed = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ('pk',)
+        indexes = [models.Index(
+            fields=['status', 'next_attempt'], name='taxjar_sync_status_idx')]
+
+    def __str__(self):
+        return 'Order #%s (%s)' % (self.order_id, self.status)
+
+
+class OrderSyncState(models.Model):
+    """
+    Fingerprints of the last order transaction payloads queued and synced.
+
+    `created_in_taxjar` records whether the transaction exists in TaxJar, so
+    syncs can pick between creating and updating it without a failed call.
+
+    """
+    order_id = models.PositiveIntegerField(unique=True)
+    fingerprint = models.CharField(max_length=40)
+    synced_fingerprint = models.CharField(max_length=40, blank=True)
+    created_in_taxjar = models.BooleanField(default=False)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return 'Order #%s' % (self.order_id,)
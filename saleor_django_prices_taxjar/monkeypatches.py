@@ -1,19 +1,33 @@
 # This file exists to monkey patch in taxjar in saleor code.
 
+from collections import OrderedDict
+
 from django.conf import settings
+from django.db.models import Case, F, IntegerField, Value, When
 
 from django_countries.fields import Country
 
 from prices import Money, TaxedMoney
 
+from django_prices_taxjar import utils as prices_taxjar_utils
+
 from saleor.checkout import utils as checkout_utils
 from saleor.checkout.models import Cart
 from saleor.dashboard.product import forms as dashboard_product_forms
 from saleor.core.utils import taxes
 from saleor.order import utils as order_utils
+from saleor.product.models import ProductVariant
+
+from .instrumentation import call_site
+from .transport import shared_session
+from .utils import (bulk_update_fields, get_taxes_for_country_region,
+                    get_taxes_for_cart_full, get_tax_rate_type_choices,
+                    get_totals_breakdown, select_line_products)
 
-from .utils import (get_taxes_for_country_region, get_taxes_for_cart_full,
-                    get_tax_rate_types)
+
+# Send rate and order tax lookups through a pooled keep-alive session with
+# timeouts instead of opening a new connection for every request.
+prices_taxjar_utils.requests = shared_session
 
 
 def get_taxes_for_cart(cart, default_taxes):
@@ -22,9 +36,10 @@ def get_taxes_for_cart(cart, default_taxes):
         return None
 
     if cart.shipping_address:
-        taxes = get_taxes_for_country_region(
-            cart.shipping_address.country,
-            cart.shipping_address.country_area)
+        with call_site('cart'):
+            taxes = get_taxes_for_country_region(
+                cart.shipping_address.country,
+                cart.shipping_address.country_area)
         return taxes
 
     return default_taxes
@@ -40,14 +55,16 @@ def get_taxes_for_address(address):
     else:
         country = Country(settings.DEFAULT_COUNTRY)
         region = None
-    return get_taxes_for_country_region(country, region)
+    with call_site('address'):
+        return get_taxes_for_country_region(country, region)
 
 
 taxes.get_taxes_for_address = get_taxes_for_address
 
 
 def get_taxes_for_country(country):
-    return get_taxes_for_country_region(country, None)
+    with call_site('country'):
+        return get_taxes_for_country_region(country, None)
 
 
 taxes.get_taxes_for_country = get_taxes_for_country
@@ -61,11 +78,7 @@ def get_total(cart, discounts=None, taxes=None):
     the order as a whole.
     """
     if cart.shipping_address and len(cart):
-        tax = get_taxes_for_cart_full(
-            cart, cart.get_shipping_price(None), discounts, None)
-        return tax(cart.get_subtotal(discounts, None) +
-                   cart.get_shipping_price(None) -
-                   cart.discount_amount)
+        return get_totals_breakdown(cart, discounts).total
     return (cart.get_subtotal(discounts, taxes) +
             cart.get_shipping_price(taxes) -
             cart.discount_amount)
@@ -74,16 +87,11 @@ def get_total(cart, discounts=None, taxes=None):
 Cart.get_total = get_total
 
 
-def get_tax_rate_type_choices():
-    rate_types = [('', '')] + get_tax_rate_types()
-    return sorted(rate_types, key=lambda x: x[0])
-
-
 dashboard_product_forms.get_tax_rate_type_choices = get_tax_rate_type_choices
 
 
 @order_utils.update_voucher_discount
-def recalculate_order(order, **kwargs):
+def recalculate_order(order, lines=None, **kwargs):
     """
     Recalculate and assign the total price of order.
 
@@ -93,10 +101,14 @@ def recalculate_order(order, **kwargs):
     discount amount.
 
     Voucher discount amount is recalculated by default. To avoid this, pass
-    update_voucher_discount argument set to False.
+    update_voucher_discount argument set to False. All `lines` of the order
+    fetched with `select_line_products` can be passed to avoid fetching them
+    again.
     """
-    # avoid using prefetched order lines
-    lines = [order_utils.OrderLine.objects.get(pk=line.pk) for line in order]
+    if lines is None:
+        # avoid using prefetched order lines
+        lines = list(select_line_products(
+            order_utils.OrderLine.objects.filter(order=order)))
     prices = [line.get_total() for line in lines]
     total = sum(prices, order.shipping_price)
     # discount amount can't be greater than order total
@@ -105,7 +117,9 @@ def recalculate_order(order, **kwargs):
         total -= order.discount_amount
 
     if order.shipping_address:
-        tax = get_taxes_for_cart_full(order, order.shipping_price, [], [])
+        tax = get_taxes_for_cart_full(
+            order, order.shipping_price, [], [],
+            call_site='recalculate_order', lines=lines)
         order.total = tax(total)
     else:
         order.total = total
@@ -123,24 +137,50 @@ def update_order_prices(order, discounts):
     Overridden to prevent taxes from being applied at the line level.
     """
     taxes = []
-
-    for line in order:
-        if line.variant:
-            line.unit_price = line.variant.get_price(discounts, taxes)
-            line.tax_rate = order_utils.get_tax_rate_by_name(
-                line.variant.product.tax_rate, taxes)
-            line.save()
+    if discounts is not None:
+        discounts = list(discounts)
+
+    lines = list(select_line_products(order.lines.all()))
+    variant_lines = [line for line in lines if line.variant_id is not None]
+    for line in variant_lines:
+        line.unit_price = line.variant.get_price(discounts, taxes)
+        line.tax_rate = order_utils.get_tax_rate_by_name(
+            line.variant.product.tax_rate, taxes)
+    bulk_update_fields(
+        variant_lines, ['unit_price_net', 'unit_price_gross', 'tax_rate'])
 
     if order.shipping_method:
         order.shipping_price = order.shipping_method.get_total_price(taxes)
         order.save()
 
-    recalculate_order(order)
+    recalculate_order(order, lines=lines)
 
 
 order_utils.update_order_prices = update_order_prices
 
 
+def get_order_line(order, variant, quantity, discounts=None, total=None,
+                   used_sale=False, voucher=None, used_voucher=False):
+    """Return a new, unsaved order line for quantity of variant."""
+    unit_price = variant.get_price()
+    price = variant.get_price(discounts, voucher=voucher, total=total, subtotal=False)
+    return order_utils.OrderLine(
+        order=order,
+        product_name=variant.display_product(),
+        product_sku=variant.sku,
+        is_shipping_required=variant.is_shipping_required(),
+        quantity=quantity,
+        variant=variant,
+        unit_price=unit_price,
+        sale_amount=unit_price.gross.amount - price.gross.amount if used_sale else 0,
+        voucher_amount=unit_price.gross.amount
+        - price.gross.amount if used_voucher else 0,
+        tax_rate=order_utils.get_tax_rate_by_name(
+            variant.product.tax_rate, []),
+        used_sale=used_sale,
+        used_voucher=used_voucher)
+
+
 def add_variant_to_order(
     order,
     variant,
@@ -161,7 +201,6 @@ def add_variant_to_order(
     line = order.lines.filter(
         variant=variant, used_voucher=used_voucher).first()
     if line:
-        line = order.lines.get(variant=variant)
         line.quantity += quantity
         if used_sale:
             line.used_sale = True
@@ -172,26 +211,81 @@ def add_variant_to_order(
         else:
             line.save(update_fields=['quantity'])
     else:
-        unit_price = variant.get_price()
-        price = variant.get_price(discounts, voucher=voucher, total=total, subtotal=False)
-        order.lines.create(
-            product_name=variant.display_product(),
-            product_sku=variant.sku,
-            is_shipping_required=variant.is_shipping_required(),
-            quantity=quantity,
-            variant=variant,
-            unit_price=unit_price,
-            sale_amount=unit_price.gross.amount - price.gross.amount if used_sale else 0,
-            voucher_amount=unit_price.gross.amount
-            - price.gross.amount if used_voucher else 0,
-            tax_rate=order_utils.get_tax_rate_by_name(
-                variant.product.tax_rate, []),
-            used_sale=used_sale,
-            used_voucher=used_voucher)
+        get_order_line(
+            order, variant, quantity, discounts=discounts, total=total,
+            used_sale=used_sale, voucher=voucher,
+            used_voucher=used_voucher).save()
 
     if variant.track_inventory:
         order_utils.allocate_stock(variant, quantity)
 
 
-
 order_utils.add_variant_to_order = add_variant_to_order
+
+
+def add_variants_to_order(
+        order, variant_quantities, discounts=None, total=None,
+        used_sale=False, voucher=None, used_voucher=False):
+    """
+    Add many (variant, quantity) pairs to order and recalculate it once.
+
+    Variants are fetched with their products in two queries, existing lines
+    are looked up with one query, new lines are inserted with one query and
+    stock is allocated with one query, so the number of queries doesn't
+    grow with the number of variants or products.
+    Raises InsufficientStock exception if any quantity could not be
+    fulfilled, before anything is changed.
+    """
+    quantities = OrderedDict()
+    for variant, quantity in variant_quantities:
+        quantities[variant.pk] = quantities.get(variant.pk, 0) + quantity
+    # Lines need the product type for shipping and sales the product's
+    # category and collections.
+    variants = ProductVariant.objects.select_related(
+        'product__product_type', 'product__category').prefetch_related(
+            'product__collections').in_bulk(list(quantities))
+    for pk, quantity in quantities.items():
+        variants[pk].check_quantity(quantity)
+    if discounts is not None:
+        discounts = list(discounts)
+
+    existing_lines = {
+        line.variant_id: line for line in order.lines.filter(
+            variant_id__in=list(quantities), used_voucher=used_voucher)}
+    updated_lines = []
+    new_lines = []
+    for pk, quantity in quantities.items():
+        line = existing_lines.get(pk)
+        if line:
+            line.quantity += quantity
+            line.used_sale = line.used_sale or used_sale
+            line.used_voucher = line.used_voucher or used_voucher
+            updated_lines.append(line)
+        else:
+            new_lines.append(get_order_line(
+                order, variants[pk], quantity, discounts=discounts,
+                total=total, used_sale=used_sale, voucher=voucher,
+                used_voucher=used_voucher))
+    bulk_update_fields(
+        updated_lines, ['quantity', 'used_sale', 'used_voucher'])
+    order_utils.OrderLine.objects.bulk_create(new_lines)
+
+    allocate_stocks([
+        (variants[pk], quantity) for pk, quantity in quantities.items()
+        if variants[pk].track_inventory])
+    recalculate_order(order)
+
+
+order_utils.add_variants_to_order = add_variants_to_order
+
+
+def allocate_stocks(variant_quantities):
+    """Allocate stock for many (variant, quantity) pairs in one query."""
+    if not variant_quantities:
+        return
+    ProductVariant.objects.filter(
+        pk__in=[variant.pk for variant, quantity in variant_quantities]
+    ).update(quantity_allocated=F('quantity_allocated') + Case(*[
+        When(pk=variant.pk, then=Value(quantity))
+        for variant, quantity in variant_quantities],
+        output_field=IntegerField()))
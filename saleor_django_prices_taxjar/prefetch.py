@@ -0,0 +1,129 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+
+from saleor.account.models import Address
+from saleor.checkout.models import Cart, CartLine
+
+from . import instrumentation
+from .cache import quote_cache
+from .utils import (
+    get_active_discounts, get_cart_quote_request, select_line_products)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PREFETCH_WORKERS = 2
+
+
+class QuotePrefetcher(object):
+    """
+    Fetch cart quotes in the background so totals find them in the cache.
+
+    Every change to a cart bumps its generation. A job only calls TaxJar if
+    no newer job was scheduled for the cart in the meantime, and only caches
+    the quote if the cart didn't change while it was in flight. The thread
+    pool is created on first use after a fork.
+
+    """
+    def __init__(self, max_workers=DEFAULT_PREFETCH_WORKERS):
+        self.max_workers = max_workers
+        self._pid = None
+        self._executor = None
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers)
+                    self._generations = {}
+                    self._pid = pid
+        return self._executor
+
+    def schedule(self, token):
+        """Prefetch the quote of the cart with `token` once committed."""
+        transaction.on_commit(lambda: self.submit(token))
+
+    def submit(self, token):
+        executor = self.executor
+        with self._lock:
+            generation = self._generations.get(token, 0) + 1
+            self._generations[token] = generation
+        executor.submit(self.run, token, generation)
+
+    def is_current(self, token, generation):
+        with self._lock:
+            return self._generations.get(token) == generation
+
+    def run(self, token, generation):
+        try:
+            with instrumentation.call_site('prefetch'):
+                self.prefetch(token, generation)
+        except Exception:
+            logger.exception('Prefetching the tax quote of %s failed', token)
+        finally:
+            with self._lock:
+                if self._generations.get(token) == generation:
+                    del self._generations[token]
+            connection.close()
+
+    def prefetch(self, token, generation):
+        if not self.is_current(token, generation):
+            instrumentation.increment('quote_prefetch', result='superseded')
+            return
+        cart = Cart.objects.select_related('shipping_address').filter(
+            token=token).first()
+        if cart is None or cart.shipping_address is None:
+            return
+        lines = list(select_line_products(cart.lines.all()))
+        if not lines:
+            return
+        key, fetch_quote = get_cart_quote_request(
+            cart, cart.get_shipping_price(None), get_active_discounts(), lines)
+        if quote_cache.get(key) is not None:
+            instrumentation.increment('quote_prefetch', result='cached')
+            return
+        quote = fetch_quote()
+        if not self.is_current(token, generation):
+            instrumentation.increment('quote_prefetch', result='stale')
+            return
+        quote_cache.set(key, quote)
+        instrumentation.increment('quote_prefetch', result='fetched')
+
+
+prefetcher = QuotePrefetcher(
+    max_workers=getattr(
+        settings, 'TAXJAR_PREFETCH_WORKERS', DEFAULT_PREFETCH_WORKERS))
+
+
+def handle_cart_save(sender, instance, *args, **kwargs):
+    if instance.shipping_address_id is not None:
+        prefetcher.schedule(instance.pk)
+
+
+def handle_cart_line_change(sender, instance, *args, **kwargs):
+    prefetcher.schedule(instance.cart_id)
+
+
+def handle_address_save(sender, instance, created=False, *args, **kwargs):
+    if created:
+        return
+    tokens = Cart.objects.filter(shipping_address=instance).values_list(
+        'token', flat=True)
+    for token in tokens:
+        prefetcher.schedule(token)
+
+
+post_save.connect(handle_cart_save, sender=Cart)
+post_save.connect(handle_cart_line_change, sender=CartLine)
+post_delete.connect(handle_cart_line_change, sender=CartLine)
+post_save.connect(handle_address_save, sender=Address)
@@ -0,0 +1,132 @@
+import logging
+import threading
+import time
+from types import MappingProxyType
+
+from django.conf import settings
+
+from django_prices_taxjar.utils import get_tax_rate, get_tax_for_rate
+
+from saleor.core.utils.taxes import DEFAULT_TAX_RATE_NAME
+
+from .transport import shared_session
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = 'https://api.taxjar.com'
+API_VERSION = '2022-01-24'
+DEFAULT_RATE_SNAPSHOT_MAX_AGE = 60 * 60
+
+# TaxJar only has summaries with regions for these countries.
+COUNTRIES_WITH_REGIONS = ('CA', 'US')
+
+
+def get_taxes_from_rates(tax_rates):
+    """Return Saleor's taxes dict for a TaxJar summary rate."""
+    return {
+        DEFAULT_TAX_RATE_NAME: {
+            'value': get_tax_rate(tax_rates),
+            'tax': get_tax_for_rate(tax_rates),
+        }
+    }
+
+
+def get_region_key(country_code, region=None):
+    """
+    Return the (country, region) pair summary rates are keyed on.
+
+    `region` may be the lazy `request.region`; it is only evaluated for
+    countries that have regional rates.
+    """
+    if country_code not in COUNTRIES_WITH_REGIONS or not region:
+        return (country_code, None)
+    return (country_code, str(region))
+
+
+def get_api_url():
+    return getattr(settings, 'TAXJAR_API_URL', '') or DEFAULT_API_URL
+
+
+def get_api_headers():
+    """Return the headers of every TaxJar request, as the client sends."""
+    return {
+        'Authorization': 'Bearer %s' % (settings.TAXJAR_ACCESS_KEY,),
+        'x-api-version': API_VERSION}
+
+
+def fetch_summary_rates():
+    """Return TaxJar's summary rates for every country and region."""
+    response = shared_session.get(
+        get_api_url() + '/v2/summary_rates', headers=get_api_headers())
+    response.raise_for_status()
+    return response.json()['summary_rates']
+
+
+def fetch_order_taxes(payload):
+    """Return the `tax` TaxJar calculates for an order's taxes payload."""
+    response = shared_session.post(
+        get_api_url() + '/v2/taxes', json=payload, headers=get_api_headers())
+    response.raise_for_status()
+    return response.json()['tax']
+
+
+class RateSnapshot(object):
+    """
+    Immutable in-process map of summary taxes keyed by (country, region).
+
+    Lookups never touch the database or network. Once the snapshot is older
+    than `max_age` a background thread fetches a new one and swaps it in;
+    until the first load finishes every lookup misses.
+
+    """
+    def __init__(self, max_age=DEFAULT_RATE_SNAPSHOT_MAX_AGE,
+                 fetch=fetch_summary_rates):
+        self.max_age = max_age
+        self.fetch = fetch
+        self.loaded_at = None
+        self._taxes = MappingProxyType({})
+        self._refreshing = threading.Lock()
+
+    def get(self, country_code, region=None, default=None):
+        if self.is_stale():
+            self.refresh_in_background()
+        return self._taxes.get(
+            get_region_key(country_code, region), default)
+
+    def is_stale(self):
+        return (self.loaded_at is None or
+                time.monotonic() - self.loaded_at > self.max_age)
+
+    def refresh(self):
+        """Fetch summary rates and atomically replace the snapshot."""
+        taxes = {}
+        for tax_rates in self.fetch():
+            key = get_region_key(
+                tax_rates['country_code'], tax_rates.get('region_code'))
+            taxes[key] = get_taxes_from_rates(tax_rates)
+        self._taxes = MappingProxyType(taxes)
+        self.loaded_at = time.monotonic()
+
+    def refresh_in_background(self):
+        if not self._refreshing.acquire(False):
+            return
+        thread = threading.Thread(target=self._refresh_and_release)
+        thread.daemon = True
+        thread.start()
+
+    def _refresh_and_release(self):
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception('Could not refresh TaxJar summary rates')
+            # Don't retry on every lookup while TaxJar is failing.
+            self.loaded_at = time.monotonic()
+        finally:
+            self._refreshing.release()
+
+    def __len__(self):
+        return len(self._taxes)
+
+
+rate_snapshot = RateSnapshot(max_age=getattr(
+    settings, 'TAXJAR_RATE_SNAPSHOT_MAX_AGE', DEFAULT_RATE_SNAPSHOT_MAX_AGE))
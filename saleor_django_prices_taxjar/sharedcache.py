@@ -0,0 +1,219 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+DEFAULT_SLOT_SIZE = 512
+WAYS = 8
+MAGIC = b'TJSC'
+VERSION = 1
+FILE_HEADER = struct.Struct('<4sHII')
+SLOT_HEADER = struct.Struct('<d20sH')
+
+
+class SharedMemoryTable(object):
+    """
+    Fixed-size hash table in a memory-mapped file shared by processes.
+
+    Keys hash to a bucket of `WAYS` slots. Setting a key reuses its slot, an
+    empty or expired one, or evicts the entry of the bucket that expires
+    first, so the file never grows. Readers and writers hold a shared or
+    exclusive `flock` on the file, which makes every update atomic for
+    other processes. Threads share the open file and so its `flock`, so
+    they also take turns on a lock of their own. The file is reopened
+    after a fork, since processes sharing an open file would also share
+    its locks.
+
+    The layout is part of the file name, so processes configured with a
+    different size use a file of their own rather than clearing or
+    misreading each other's.
+
+    """
+    def __init__(self, path, max_entries, slot_size=DEFAULT_SLOT_SIZE):
+        self.slot_size = slot_size
+        self.buckets = max(1, -(-max_entries // WAYS))
+        self.slots = self.buckets * WAYS
+        self.size = FILE_HEADER.size + self.slots * slot_size
+        self.path = '%s.v%d-%dx%d' % (path, VERSION, self.slots, slot_size)
+        self._pid = None
+        self._fd = None
+        self._map = None
+        self._lock = threading.Lock()
+        self._io_lock = None
+
+    @property
+    def max_value_size(self):
+        return self.slot_size - SLOT_HEADER.size
+
+    def _open(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                    try:
+                        self._initialize(fd)
+                        self._map = mmap.mmap(fd, self.size)
+                    except Exception:
+                        # Closing the file also releases its lock.
+                        os.close(fd)
+                        raise
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                    self._fd = fd
+                    self._io_lock = threading.Lock()
+                    self._pid = pid
+        return self._fd, self._map, self._io_lock
+
+    def _initialize(self, fd):
+        header = FILE_HEADER.pack(
+            MAGIC, VERSION, self.slots, self.slot_size)
+        size = os.fstat(fd).st_size
+        if size == 0:
+            os.ftruncate(fd, self.size)
+            os.pwrite(fd, header, 0)
+        elif (size != self.size or
+                os.pread(fd, FILE_HEADER.size, 0) != header):
+            raise ImproperlyConfigured(
+                '%s is not a shared cache table of %d slots of %d bytes.' % (
+                    self.path, self.slots, self.slot_size))
+
+    @contextmanager
+    def _locked(self, operation):
+        fd, table, io_lock = self._open()
+        with io_lock:
+            fcntl.flock(fd, operation)
+            try:
+                yield table
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _get_offsets(self, digest):
+        bucket = int.from_bytes(digest[:8], 'little') % self.buckets
+        start = FILE_HEADER.size + bucket * WAYS * self.slot_size
+        return range(start, start + WAYS * self.slot_size, self.slot_size)
+
+    def _find(self, table, digest, now):
+        for offset in self._get_offsets(digest):
+            expires, slot_digest, length = SLOT_HEADER.unpack_from(
+                table, offset)
+            if slot_digest == digest and expires > now:
+                return offset, length
+        return None, None
+
+    def get(self, digest):
+        """Return the value stored for `digest` as bytes, or None."""
+        with self._locked(fcntl.LOCK_SH) as table:
+            offset, length = self._find(table, digest, time.time())
+            if offset is None:
+                return None
+            start = offset + SLOT_HEADER.size
+            return table[start:start + length]
+
+    def set(self, digest, data, expires, only_new=False):
+        """
+        Store `data` for `digest` until `expires`.
+
+        Returns False if the value doesn't fit in a slot, or if `only_new`
+        is set and there already is an entry.
+        """
+        if len(data) > self.max_value_size:
+            return False
+        now = time.time()
+        with self._locked(fcntl.LOCK_EX) as table:
+            target = None
+            target_expires = None
+            for offset in self._get_offsets(digest):
+                slot_expires, slot_digest, _ = SLOT_HEADER.unpack_from(
+                    table, offset)
+                if slot_digest == digest:
+                    if only_new and slot_expires > now:
+                        return False
+                    target = offset
+                    break
+                if target is None or slot_expires < target_expires:
+                    target = offset
+                    target_expires = slot_expires
+            start = target + SLOT_HEADER.size
+            table[start:start + len(data)] = data
+            SLOT_HEADER.pack_into(table, target, expires, digest, len(data))
+        return True
+
+    def delete(self, digest):
+        with self._locked(fcntl.LOCK_EX) as table:
+            offset, _ = self._find(table, digest, time.time())
+            if offset is None:
+                return False
+            SLOT_HEADER.pack_into(table, offset, 0, b'', 0)
+            return True
+
+    def clear(self):
+        with self._locked(fcntl.LOCK_EX) as table:
+            table[FILE_HEADER.size:] = bytes(self.size - FILE_HEADER.size)
+
+
+class SharedMemoryCache(BaseCache):
+    """
+    Django cache backend shared by the workers of a single host.
+
+    `LOCATION` is the path of the table file, `MAX_ENTRIES` bounds the
+    number of entries and the `SLOT_SIZE` option the bytes kept per entry.
+    Pickled values larger than a slot are not cached.
+
+    """
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.table = SharedMemoryTable(
+            location, self._max_entries,
+            slot_size=int(options.get('SLOT_SIZE', DEFAULT_SLOT_SIZE)))
+
+    def _get_digest(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return hashlib.sha1(key.encode()).digest()
+
+    def _get_expires(self, timeout):
+        expires = self.get_backend_timeout(timeout)
+        return float('inf') if expires is None else expires
+
+    def get(self, key, default=None, version=None):
+        data = self.table.get(self._get_digest(key, version))
+        if data is None:
+            return default
+        return pickle.loads(data)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        digest = self._get_digest(key, version)
+        expires = self._get_expires(timeout)
+        if expires <= time.time():
+            self.table.delete(digest)
+            return
+        self.table.set(
+            digest, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._get_expires(timeout)
+        if expires <= time.time():
+            return False
+        return self.table.set(
+            self._get_digest(key, version),
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires,
+            only_new=True)
+
+    def delete(self, key, version=None):
+        self.table.delete(self._get_digest(key, version))
+
+    def has_key(self, key, version=None):
+        return self.table.get(self._get_digest(key, version)) is not None
+
+    def clear(self):
+        self.table.clear()
@@ -0,0 +1,274 @@
+import logging
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+import taxjar
+from taxjar.exceptions import TaxJarResponseError
+
+from . import instrumentation
+from .canonical import OrderTransaction
+from .models import OrderSyncOperation, OrderSyncState
+from .rates import API_VERSION
+from .transport import get_timeout, shared_session
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYNC_MAX_ATTEMPTS = 8
+DEFAULT_SYNC_CLAIM_TIMEOUT = 5 * 60
+DEFAULT_SYNC_RETRY_DELAY = 60
+MAX_SYNC_RETRY_DELAY = 24 * 60 * 60
+
+# Key of the advisory lock taken by workers claiming operations.
+CLAIM_LOCK_ID = 0x54784a53
+
+
+def create_client(api_url=None):
+    """Return a TaxJar client, optionally for another API endpoint."""
+    client = taxjar.Client(
+        api_key=settings.TAXJAR_ACCESS_KEY,
+        api_url=api_url or getattr(settings, 'TAXJAR_API_URL', ''))
+    client.set_api_config('headers', {
+      'x-api-version': API_VERSION
+    })
+    client.set_api_config('timeout', get_timeout())
+    client.session = shared_session
+    return client
+
+
+client = create_client()
+
+
+def get_order_transaction_payload(order):
+    """
+    Return the TaxJar order transaction data for an order.
+
+    Amounts are exact decimal strings, so the payload can be stored as JSON
+    and fingerprinted without float rounding.
+    """
+    return OrderTransaction.build(order).as_dict()
+
+
+def get_payload_fingerprint(payload):
+    return OrderTransaction.from_dict(payload).fingerprint()
+
+
+def enqueue_order_sync(order, payload=None):
+    """
+    Queue the order's transaction to be synced to TaxJar.
+
+    The operation is written with the current database connection, so it is
+    committed or rolled back together with the save that triggered it.
+    Returns None without queueing anything if the same payload was already
+    queued for the order.
+    """
+    if payload is None:
+        payload = get_order_transaction_payload(order)
+    fingerprint = get_payload_fingerprint(payload)
+    state, created = OrderSyncState.objects.get_or_create(
+        order_id=order.id, defaults={'fingerprint': fingerprint})
+    if not created:
+        if state.fingerprint == fingerprint:
+            return None
+        state.fingerprint = fingerprint
+        state.save(update_fields=['fingerprint', 'updated'])
+    instrumentation.increment('order_sync_queued')
+    return OrderSyncOperation.objects.create(
+        order_id=order.id, payload=payload)
+
+
+def is_order_sync_pending(order, payload):
+    """
+    Return whether `payload` differs from the last one queued.
+
+    Payloads whose sync finally failed don't count as queued, so they are
+    queued again.
+    """
+    fingerprint = get_payload_fingerprint(payload)
+    return not OrderSyncState.objects.filter(
+        order_id=order.id, fingerprint=fingerprint).exists()
+
+
+def get_sync_states(order_ids):
+    """Return the `OrderSyncState` of the given orders keyed by order id."""
+    return {
+        state.order_id: state for state in OrderSyncState.objects.filter(
+            order_id__in=order_ids)}
+
+
+def is_payload_synced(state, payload):
+    """Return whether TaxJar already has exactly `payload`."""
+    return (state is not None and
+            state.synced_fingerprint == get_payload_fingerprint(payload))
+
+
+def sync_order_transaction(payload, client=client, created=False):
+    """
+    Send the transaction to TaxJar.
+
+    It is updated if `created` says it was synced before and created
+    otherwise. Transactions synced before their state was recorded locally
+    make the create fail, and are updated instead.
+    """
+    data = OrderTransaction.from_dict(payload).to_api_payload()
+    if not created:
+        try:
+            with instrumentation.timer(
+                    'taxjar_request', endpoint='create_order'):
+                client.create_order(data)
+            return
+        except TaxJarResponseError:
+            pass
+    with instrumentation.timer('taxjar_request', endpoint='update_order'):
+        client.update_order(data['transaction_id'], data)
+
+
+def mark_order_synced(order_id, payload, queued=True):
+    """
+    Record `payload` as synced so the same data isn't sent again.
+
+    With `queued` it is also recorded as the last payload queued, which is
+    only right when no newer operation can be waiting for the order.
+    """
+    fingerprint = get_payload_fingerprint(payload)
+    defaults = {'synced_fingerprint': fingerprint, 'created_in_taxjar': True}
+    if queued:
+        defaults['fingerprint'] = fingerprint
+    OrderSyncState.objects.update_or_create(
+        order_id=order_id, defaults=defaults)
+
+
+def get_retry_delay(attempts):
+    """Return the exponential backoff before retrying a failed sync."""
+    base = getattr(settings, 'TAXJAR_SYNC_RETRY_DELAY',
+                   DEFAULT_SYNC_RETRY_DELAY)
+    return timedelta(seconds=min(
+        base * 2 ** max(attempts - 1, 0), MAX_SYNC_RETRY_DELAY))
+
+
+def claim_pending_operations(limit=100):
+    """
+    Claim the latest due operation of up to `limit` orders.
+
+    Older operations of the same orders are marked superseded. Claimed
+    operations count an attempt and stay claimed for
+    `TAXJAR_SYNC_CLAIM_TIMEOUT` seconds, or until their result is recorded.
+    Meanwhile other workers skip every operation of the order, so an order
+    is only synced by one worker at a time, and the operation is retried if
+    the worker dies. Workers take turns claiming, so each sees the claims
+    of the others.
+    """
+    claim_timeout = getattr(
+        settings, 'TAXJAR_SYNC_CLAIM_TIMEOUT', DEFAULT_SYNC_CLAIM_TIMEOUT)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [CLAIM_LOCK_ID])
+        now = timezone.now()
+        claimed_orders = OrderSyncOperation.objects.filter(
+            status=OrderSyncOperation.STATUS_PENDING,
+            claimed_until__gt=now).values('order_id')
+        operations = OrderSyncOperation.objects.select_for_update(
+            skip_locked=True).filter(
+                status=OrderSyncOperation.STATUS_PENDING,
+                next_attempt__lte=now).exclude(
+                    order_id__in=claimed_orders).order_by('pk')[:limit]
+        latest_by_order = OrderedDict(
+            (operation.order_id, operation) for operation in operations)
+        for order_id, latest in latest_by_order.items():
+            OrderSyncOperation.objects.filter(
+                order_id=order_id, status=OrderSyncOperation.STATUS_PENDING,
+                pk__lt=latest.pk).update(
+                    status=OrderSyncOperation.STATUS_SUPERSEDED,
+                    processed=now)
+            latest.attempts += 1
+            latest.claimed_until = now + timedelta(seconds=claim_timeout)
+        OrderSyncOperation.objects.filter(
+            pk__in=[latest.pk for latest in latest_by_order.values()]).update(
+                attempts=F('attempts') + 1,
+                claimed_until=now + timedelta(seconds=claim_timeout))
+    return latest_by_order
+
+
+def record_operation_result(operation, error, max_attempts):
+    """
+    Save the outcome of syncing `operation`; `error` is None on success.
+
+    Operations superseded in the meantime, after their claim timed out, are
+    left superseded. Returns whether the outcome was saved.
+    """
+    now = timezone.now()
+    operation.claimed_until = None
+    if error is None:
+        operation.status = OrderSyncOperation.STATUS_DONE
+        operation.last_error = ''
+        operation.processed = now
+    else:
+        operation.last_error = repr(error)
+        if operation.attempts >= max_attempts:
+            operation.status = OrderSyncOperation.STATUS_FAILED
+            operation.processed = now
+        else:
+            operation.next_attempt = now + get_retry_delay(operation.attempts)
+    saved = OrderSyncOperation.objects.filter(
+        pk=operation.pk, status=OrderSyncOperation.STATUS_PENDING).update(
+            status=operation.status, last_error=operation.last_error,
+            processed=operation.processed,
+            next_attempt=operation.next_attempt, claimed_until=None)
+    if saved and operation.status == OrderSyncOperation.STATUS_FAILED:
+        # Forget the payload was queued, so the next save of the order
+        # queues it again instead of being skipped as unchanged.
+        OrderSyncState.objects.filter(
+            order_id=operation.order_id,
+            fingerprint=get_payload_fingerprint(operation.payload)).update(
+                fingerprint='')
+    return bool(saved)
+
+
+def process_pending_operations(limit=100):
+    """
+    Sync due operations to TaxJar and record the outcome.
+
+    Operations queued for the same order are coalesced, so only the latest
+    payload is sent, and payloads TaxJar already has aren't sent at all.
+    No transaction is held open while TaxJar is called; the outcome of
+    every order is recorded in a transaction of its own. Returns the number
+    of orders synced and failed.
+    """
+    max_attempts = getattr(
+        settings, 'TAXJAR_SYNC_MAX_ATTEMPTS', DEFAULT_SYNC_MAX_ATTEMPTS)
+    synced = failed = 0
+    with instrumentation.call_site('sync_worker'):
+        latest_by_order = claim_pending_operations(limit)
+        states = get_sync_states(latest_by_order.keys())
+        for order_id, latest in latest_by_order.items():
+            state = states.get(order_id)
+            error = None
+            try:
+                if not is_payload_synced(state, latest.payload):
+                    sync_order_transaction(
+                        latest.payload,
+                        created=state is not None and state.created_in_taxjar)
+            except Exception as e:
+                error = e
+            try:
+                with transaction.atomic():
+                    if error is None:
+                        mark_order_synced(
+                            order_id, latest.payload, queued=False)
+                    record_operation_result(latest, error, max_attempts)
+            except DatabaseError:
+                # Left claimed, the operation is retried once the claim
+                # times out.
+                logger.exception(
+                    'Could not record the TaxJar sync of order %s', order_id)
+                failed += 1
+                continue
+            if error is None:
+                synced += 1
+            else:
+                failed += 1
+    return synced, failed
@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from .sync import process_pending_operations
+
+
+@shared_task
+def sync_orders_task(limit=100):
+    """Drain the queue of order transactions waiting to be synced."""
+    return process_pending_operations(limit)
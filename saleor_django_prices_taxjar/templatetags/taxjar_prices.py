@@ -0,0 +1,30 @@
+from django import template
+
+from ..listing import get_taxed_prices
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def taxed_prices(context, items, attr=None, keep_gross=False):
+    """
+    Tax the prices of a whole listing at the request's rate.
+
+    Without `attr` `items` are the prices and the taxed prices are returned.
+    With it, prices are read from that attribute of every item and
+    `(item, taxed price)` pairs are returned:
+
+        {% load taxjar_prices %}
+        {% taxed_prices products 'price_range' as priced %}
+        {% for product, price in priced %}...{% endfor %}
+
+    """
+    request = context['request']
+    items = list(items)
+    prices = items if attr is None else [getattr(item, attr) for item in items]
+    taxed = get_taxed_prices(
+        prices, getattr(request, 'country', None),
+        getattr(request, 'region', None), keep_gross=keep_gross)
+    if attr is None:
+        return taxed
+    return list(zip(items, taxed))
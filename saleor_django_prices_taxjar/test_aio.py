@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from prices import Money, TaxedMoney
+
+pytest.importorskip('aiohttp')
+
+from . import aio  # noqa: E402
+from .cache import quote_cache  # noqa: E402
+from .canonical import TaxRequest  # noqa: E402
+from .rates import API_VERSION  # noqa: E402
+from .utils import QuotedTax  # noqa: E402
+
+# Blocking code runs in other threads, which only see committed data.
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+def get_expected_tax(fake, tax_request):
+    return QuotedTax.from_response(
+        fake.get_taxes(tax_request.to_api_payload())['tax'])
+
+
+def test_get_quote(fake_taxjar_server, address):
+    quote_cache.clear()
+    tax_request = TaxRequest.build(
+        address, Money(5, 'USD'), amount=Money(10, 'USD'))
+
+    async def get_quotes():
+        async with aio.AsyncTaxJarClient(
+                api_url=fake_taxjar_server.api_url) as client:
+            return [
+                await client.get_quote(tax_request),
+                await client.get_quote(tax_request)]
+
+    first, second = run(get_quotes())
+    fake = fake_taxjar_server.fake
+    assert first == second == get_expected_tax(fake, tax_request)
+    assert fake.call_count == 1
+    assert fake.last_headers['x-api-version'] == API_VERSION
+    assert quote_cache.get(tax_request.fingerprint()) == first
+
+
+def test_aget_taxes_for_cart_full(
+        fake_taxjar_server, cart, address, product):
+    quote_cache.clear()
+    cart.shipping_address = address
+    cart.save()
+    cart.lines.create(variant=product.variants.first(), quantity=2)
+    shipping_costs = [
+        TaxedMoney(net=Money(amount, 'USD'), gross=Money(amount, 'USD'))
+        for amount in (0, 10, 20)]
+
+    client = aio.AsyncTaxJarClient(api_url=fake_taxjar_server.api_url)
+    taxes = run(aio.aget_taxes_for_cart_full(
+        cart, shipping_costs, None, client=client))
+    run(client.close())
+
+    assert len(taxes) == 3
+    assert all(isinstance(tax, QuotedTax) for tax in taxes)
+    assert fake_taxjar_server.fake.calls[('POST', '/v2/taxes')] == 3
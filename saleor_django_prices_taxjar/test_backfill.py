@@ -0,0 +1,102 @@
+from io import StringIO
+
+import pytest
+
+from django.core.management import call_command
+
+from saleor.order.models import Order, PaymentStatus
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def paid_orders(address):
+    orders = []
+    for i in range(3):
+        order = Order.objects.create(
+            billing_address=address.get_copy(),
+            user_email='backfill-%d@example.com' % (i,))
+        order.payments.create(
+            variant='default', status=PaymentStatus.CONFIRMED,
+            total=order.total.gross.amount,
+            currency=order.total.gross.currency)
+        orders.append(order)
+    return orders
+
+
+def backfill(server, **options):
+    stdout = StringIO()
+    stderr = StringIO()
+    call_command(
+        'taxjar_backfill_orders', api_url=server.api_url, rate=0, workers=2,
+        stdout=stdout, stderr=stderr, **options)
+    return stdout.getvalue(), stderr.getvalue()
+
+
+def fail_order(monkeypatch, fake, order):
+    handle = fake.handle
+
+    def failing_handle(method, path, data, headers=None):
+        if path.rstrip('/').endswith('/%s' % (order.pk,)) or (
+                str(data.get('transaction_id')) == str(order.pk)):
+            return 500, fake.error(500, 'Internal Server Error')
+        return handle(method, path, data, headers)
+
+    monkeypatch.setattr(fake, 'handle', failing_handle)
+
+
+def test_backfill_push(fake_taxjar_server, paid_orders):
+    stdout, stderr = backfill(fake_taxjar_server)
+
+    assert '3 orders, 0 failed' in stdout
+    assert not stderr
+    assert set(fake_taxjar_server.fake.orders) == {
+        str(order.pk) for order in paid_orders}
+
+    # Orders TaxJar already has aren't sent again.
+    fake_taxjar_server.fake.calls.clear()
+    backfill(fake_taxjar_server)
+    assert fake_taxjar_server.fake.call_count == 0
+
+
+def test_backfill_verify(fake_taxjar_server, paid_orders):
+    backfill(fake_taxjar_server)
+    fake = fake_taxjar_server.fake
+    fake.orders[str(paid_orders[1].pk)]['sales_tax'] = 99
+    del fake.orders[str(paid_orders[2].pk)]
+
+    stdout, stderr = backfill(fake_taxjar_server, verify=True)
+
+    assert '3 orders, 2 failed' in stdout
+    assert 'Order #%s: sales_tax' % (paid_orders[1].pk,) in stderr
+    assert 'Order #%s: missing in TaxJar' % (paid_orders[2].pk,) in stderr
+
+
+def test_backfill_resume(
+        monkeypatch, tmpdir, fake_taxjar_server, paid_orders):
+    checkpoint = str(tmpdir.join('backfill.txt'))
+    fake = fake_taxjar_server.fake
+    first, failing, last = paid_orders
+    fail_order(monkeypatch, fake, failing)
+
+    # One order per chunk, so later chunks succeed after the failure.
+    stdout, stderr = backfill(
+        fake_taxjar_server, checkpoint=checkpoint, chunk_size=1)
+
+    assert '3 orders, 1 failed' in stdout
+    assert 'Order #%s' % (failing.pk,) in stderr
+    assert set(fake.orders) == {str(first.pk), str(last.pk)}
+    with open(checkpoint) as f:
+        assert first.pk <= int(f.read()) < failing.pk
+
+    monkeypatch.undo()
+    fake.calls.clear()
+    stdout, stderr = backfill(
+        fake_taxjar_server, checkpoint=checkpoint, chunk_size=1)
+
+    assert '2 orders, 0 failed' in stdout
+    assert str(failing.pk) in fake.orders
+    # The last order was pushed by the first run and isn't sent again.
+    assert fake.calls[('POST', '/v2/transactions/orders')] == 1
+    with open(checkpoint) as f:
+        assert int(f.read()) == last.pk
@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from .cache import TaxQuoteCache, memoize_in_scope, tax_scope
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = TaxQuoteCache(ttl=10)
+    cache.set('a', 1)
+    clock[0] += 9
+    assert cache.get('a') == 1
+    clock[0] += 2
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TaxQuoteCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_hit_and_miss_counters():
+    cache = TaxQuoteCache()
+    cache.get('a')
+    cache.set('a', 1)
+    cache.get('a')
+    cache.get('a')
+    assert cache.stats() == {
+        'hits': 2, 'misses': 1, 'size': 1, 'maxsize': cache.maxsize}
+    cache.clear()
+    assert cache.stats()['hits'] == cache.stats()['misses'] == 0
+
+
+def test_get_or_set_computes_once():
+    cache = TaxQuoteCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return 'quote'
+
+    assert cache.get_or_set('a', compute) == 'quote'
+    assert cache.get_or_set('a', compute) == 'quote'
+    assert len(calls) == 1
+    # Failed lookups aren't cached.
+    assert cache.get_or_set('b', lambda: None) is None
+    assert cache.get('b') is None
+
+
+def test_backend_read_through(settings):
+    settings.CACHES = dict(settings.CACHES, taxjar={
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'taxjar-test'})
+    writer = TaxQuoteCache(alias='taxjar')
+    reader = TaxQuoteCache(alias='taxjar')
+    writer.set('a', 'quote')
+
+    assert len(reader) == 0
+    assert reader.get('a') == 'quote'
+    assert len(reader) == 1
+    assert reader.stats()['hits'] == 1
+    assert writer.backend.get(writer.key_prefix + 'a') == 'quote'
+
+
+def test_memoize_in_scope():
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert memoize_in_scope('a', compute) == 1
+    assert memoize_in_scope('a', compute) == 2
+    with tax_scope():
+        assert memoize_in_scope('a', compute) == 3
+        with tax_scope():
+            assert memoize_in_scope('a', compute) == 3
+    assert memoize_in_scope('a', compute) == 4
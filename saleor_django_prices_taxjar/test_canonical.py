@@ -0,0 +1,62 @@
+from decimal import Decimal
+from types import SimpleNamespace
+
+from prices import Money
+
+from .canonical import OrderTransaction, TaxRequest, canonical_decimal
+
+ADDRESS = SimpleNamespace(
+    country=SimpleNamespace(code='US'), postal_code='90002',
+    country_area='CA', city='Los Angeles', street_address_1='1335 E 103rd St')
+
+
+def build_request(shipping='5', line_items=None):
+    if line_items is None:
+        line_items = [
+            (1, 2, Money('10.00', 'USD'), 'A', Money('0', 'USD')),
+            (2, 1, Money('3.5', 'USD'), 'B', Money('0.50', 'USD'))]
+    return TaxRequest.build(
+        ADDRESS, Money(shipping, 'USD'), line_items=line_items)
+
+
+def test_canonical_decimal():
+    assert str(canonical_decimal('10.00')) == '10'
+    assert str(canonical_decimal('1E+1')) == '10'
+    assert str(canonical_decimal('3.50')) == '3.5'
+
+
+def test_fingerprint_is_stable():
+    # Fingerprints key quotes shared between workers and releases.
+    assert build_request().fingerprint() == (
+        '27ac5e007c93284d5b4611699c8e4b9c46e93b91')
+
+
+def test_fingerprint_ignores_representation_and_order():
+    request = build_request()
+    assert build_request(shipping='5.00').fingerprint() == (
+        request.fingerprint())
+    assert build_request(line_items=[
+        (2, 1, Money('3.50', 'USD'), 'B', Money('0.5', 'USD')),
+        (1, 2, Money('1E+1', 'USD'), 'A', Money('0.00', 'USD')),
+    ]).fingerprint() == request.fingerprint()
+
+
+def test_fingerprint_changes_with_request():
+    fingerprint = build_request().fingerprint()
+    assert build_request(shipping='6').fingerprint() != fingerprint
+    assert build_request(line_items=[
+        (1, 3, Money('10', 'USD'), 'A', Money('0', 'USD')),
+        (2, 1, Money('3.5', 'USD'), 'B', Money('0.5', 'USD')),
+    ]).fingerprint() != fingerprint
+
+
+def test_order_transaction_round_trip():
+    transaction = OrderTransaction(
+        transaction_id='1', transaction_date='2018-06-01T00:00:00+00:00',
+        to_country='US', to_zip='90002', to_state='CA', to_city=None,
+        to_street=None, amount=Decimal('10.5'), shipping=Decimal('2'),
+        sales_tax=Decimal('0.76'))
+    restored = OrderTransaction.from_dict(transaction.as_dict())
+    assert restored == transaction
+    assert restored.fingerprint() == transaction.fingerprint()
+    assert restored.to_api_payload()['amount'] == 10.5
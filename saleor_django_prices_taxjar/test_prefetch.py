@@ -0,0 +1,29 @@
+from datetime import date, timedelta
+
+from saleor.discount.models import Sale
+
+from .cache import quote_cache
+from .prefetch import QuotePrefetcher
+from .utils import get_active_discounts, get_totals_breakdown
+
+
+def test_prefetched_quote_is_used_by_cart_totals(
+        monkeypatch, fake_taxjar, cart, address, product, sale):
+    # Sale.objects.all() would also apply this one and change the key.
+    expired = Sale.objects.create(
+        name='Expired', value=50,
+        start_date=date.today() - timedelta(days=10),
+        end_date=date.today() - timedelta(days=1))
+    expired.products.add(product)
+    cart.shipping_address = address
+    cart.save()
+    cart.lines.create(variant=product.variants.first(), quantity=1)
+    quote_cache.clear()
+    prefetcher = QuotePrefetcher()
+    monkeypatch.setattr(prefetcher, 'is_current', lambda *args: True)
+
+    prefetcher.prefetch(cart.token, 1)
+    assert fake_taxjar.call_count == 1
+
+    get_totals_breakdown(cart, get_active_discounts())
+    assert fake_taxjar.call_count == 1
@@ -0,0 +1,69 @@
+import pytest
+
+from saleor.discount.models import Sale
+
+from . import monkeypatches
+from .testing import add_order_lines, count_queries, create_products
+from .utils import get_active_discounts, get_line_items
+
+# The number of queries must not grow with the number of lines.
+
+
+@pytest.mark.parametrize('with_sale', [False, True])
+def test_get_line_items_queries(
+        django_assert_num_queries, cart, product, sale, with_sale):
+    discounts = None
+    if with_sale:
+        discounts = Sale.objects.prefetch_related(
+            'products', 'categories', 'collections')
+
+    def add_lines(count):
+        for copy in create_products(product, count):
+            cart.lines.create(variant=copy.variants.get(), quantity=1)
+
+    add_lines(1)
+    queries = count_queries(lambda: get_line_items(cart, discounts))
+    add_lines(99)
+    with django_assert_num_queries(queries):
+        assert len(get_line_items(cart, discounts)) == 100
+
+
+def assert_flat_order_queries(django_assert_num_queries, order, product,
+                              func):
+    add_order_lines(order, [
+        copy.variants.get() for copy in create_products(product, 1)])
+    queries = count_queries(lambda: func(order))
+    add_order_lines(order, [
+        copy.variants.get() for copy in create_products(product, 99)])
+    with django_assert_num_queries(queries):
+        func(order)
+
+
+def test_recalculate_order_queries(
+        django_assert_num_queries, fake_taxjar, shipped_order, product):
+    assert_flat_order_queries(
+        django_assert_num_queries, shipped_order, product,
+        monkeypatches.recalculate_order)
+
+
+def test_update_order_prices_queries(
+        django_assert_num_queries, fake_taxjar, shipped_order, product):
+    assert_flat_order_queries(
+        django_assert_num_queries, shipped_order, product,
+        lambda order: monkeypatches.update_order_prices(order, None))
+
+
+def test_add_variants_to_order_queries(
+        django_assert_num_queries, fake_taxjar, shipped_order, product, sale):
+    def add_products(count):
+        variants = [
+            copy.variants.get() for copy in create_products(product, count)]
+        return lambda: monkeypatches.add_variants_to_order(
+            shipped_order, [(variant, 1) for variant in variants],
+            discounts=get_active_discounts())
+
+    queries = count_queries(add_products(1))
+    add = add_products(100)
+    with django_assert_num_queries(queries):
+        add()
+    assert shipped_order.lines.count() == 101
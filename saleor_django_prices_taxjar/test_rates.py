@@ -0,0 +1,11 @@
+from .rates import API_VERSION, fetch_order_taxes, fetch_summary_rates
+
+
+def test_fetch_order_taxes_sends_api_version(fake_taxjar):
+    fetch_order_taxes({'to_country': 'US', 'amount': '10', 'shipping': '0'})
+    assert fake_taxjar.last_headers['x-api-version'] == API_VERSION
+
+
+def test_fetch_summary_rates_sends_api_version(fake_taxjar):
+    assert fetch_summary_rates()
+    assert fake_taxjar.last_headers['x-api-version'] == API_VERSION
@@ -0,0 +1,147 @@
+import hashlib
+import os
+import threading
+import time
+
+import pytest
+
+from django.core.exceptions import ImproperlyConfigured
+
+from . import sharedcache
+from .sharedcache import WAYS, SharedMemoryCache, SharedMemoryTable
+
+
+def get_digest(key):
+    return hashlib.sha1(key.encode()).digest()
+
+
+@pytest.fixture
+def table(tmpdir):
+    return SharedMemoryTable(str(tmpdir.join('cache')), 64, slot_size=128)
+
+
+def test_set_get_delete(table):
+    expires = time.time() + 60
+    assert table.get(get_digest('a')) is None
+    assert table.set(get_digest('a'), b'first', expires)
+    assert table.set(get_digest('a'), b'second', expires)
+    assert table.get(get_digest('a')) == b'second'
+    assert table.delete(get_digest('a'))
+    assert table.get(get_digest('a')) is None
+    assert not table.delete(get_digest('a'))
+
+
+def test_only_new(table):
+    assert table.set(get_digest('a'), b'first', time.time() + 60)
+    assert not table.set(
+        get_digest('a'), b'second', time.time() + 60, only_new=True)
+    assert table.get(get_digest('a')) == b'first'
+
+
+def test_value_larger_than_slot(table):
+    assert not table.set(
+        get_digest('a'), bytes(table.max_value_size + 1), time.time() + 60)
+    assert table.get(get_digest('a')) is None
+
+
+def test_expiry(monkeypatch, table):
+    now = time.time()
+    table.set(get_digest('a'), b'value', now + 10)
+    assert table.get(get_digest('a')) == b'value'
+    monkeypatch.setattr(sharedcache.time, 'time', lambda: now + 11)
+    assert table.get(get_digest('a')) is None
+    # The expired entry doesn't block adding a new one.
+    assert table.set(get_digest('a'), b'new', now + 20, only_new=True)
+
+
+def test_eviction_of_first_expiring(tmpdir):
+    # A single bucket, so every key competes for the same slots.
+    table = SharedMemoryTable(str(tmpdir.join('cache')), WAYS)
+    now = time.time()
+    for i in range(WAYS):
+        table.set(get_digest(str(i)), b'%d' % (i,), now + 100 - i)
+
+    table.set(get_digest('new'), b'new', now + 100)
+
+    assert table.get(get_digest('new')) == b'new'
+    assert table.get(get_digest(str(WAYS - 1))) is None
+    for i in range(WAYS - 1):
+        assert table.get(get_digest(str(i))) == b'%d' % (i,)
+
+
+def test_clear(table):
+    table.set(get_digest('a'), b'value', time.time() + 60)
+    table.clear()
+    assert table.get(get_digest('a')) is None
+
+
+def test_layout_in_file_name(tmpdir):
+    path = str(tmpdir.join('cache'))
+    small = SharedMemoryTable(path, 64, slot_size=128)
+    large = SharedMemoryTable(path, 64, slot_size=256)
+    assert small.path != large.path
+    small.set(get_digest('a'), b'small', time.time() + 60)
+    large.set(get_digest('a'), b'large', time.time() + 60)
+    assert small.get(get_digest('a')) == b'small'
+    assert large.get(get_digest('a')) == b'large'
+
+
+def test_foreign_file_is_not_reused(tmpdir):
+    table = SharedMemoryTable(str(tmpdir.join('cache')), 64)
+    with open(table.path, 'wb') as f:
+        f.write(b'not a table')
+    with pytest.raises(ImproperlyConfigured):
+        table.get(get_digest('a'))
+    with open(table.path, 'rb') as f:
+        assert f.read() == b'not a table'
+
+
+def test_threads(table):
+    expires = time.time() + 60
+    errors = []
+
+    def write_and_read(i):
+        digest = get_digest(str(i))
+        value = bytes([i]) * table.max_value_size
+        for _ in range(200):
+            table.set(digest, value, expires)
+            read = table.get(digest)
+            if read is not None and read != value:
+                errors.append((i, read))
+
+    threads = [
+        threading.Thread(target=write_and_read, args=(i,))
+        for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+
+def test_shared_after_fork(table):
+    table.set(get_digest('parent'), b'parent', time.time() + 60)
+    pid = os.fork()
+    if pid == 0:
+        ok = False
+        try:
+            ok = table.get(get_digest('parent')) == b'parent'
+            table.set(get_digest('child'), b'child', time.time() + 60)
+        finally:
+            os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert table.get(get_digest('child')) == b'child'
+
+
+def test_cache_backend(tmpdir):
+    cache = SharedMemoryCache(
+        str(tmpdir.join('cache')), {'OPTIONS': {'MAX_ENTRIES': 64}})
+    cache.set('key', {'rate': '0.0725'})
+    assert cache.get('key') == {'rate': '0.0725'}
+    assert not cache.add('key', 'other')
+    assert cache.has_key('key')
+    cache.delete('key')
+    assert cache.get('key', 'missing') == 'missing'
+    cache.set('key', 'expired', timeout=0)
+    assert not cache.has_key('key')
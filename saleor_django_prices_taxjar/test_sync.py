@@ -0,0 +1,42 @@
+import pytest
+
+from .models import OrderSyncOperation
+from .sync import claim_pending_operations, record_operation_result
+
+pytestmark = pytest.mark.django_db
+
+
+def test_claimed_order_is_skipped_until_recorded():
+    first = OrderSyncOperation.objects.create(order_id=1, payload={})
+    assert list(claim_pending_operations()) == [1]
+
+    # Queued while the first operation is synced by another worker.
+    second = OrderSyncOperation.objects.create(order_id=1, payload={})
+    other = OrderSyncOperation.objects.create(order_id=2, payload={})
+    claimed = claim_pending_operations()
+    assert list(claimed) == [2]
+    first.refresh_from_db()
+    assert first.status == OrderSyncOperation.STATUS_PENDING
+
+    record_operation_result(claimed[2], None, max_attempts=8)
+    record_operation_result(first, None, max_attempts=8)
+    first.refresh_from_db()
+    assert first.status == OrderSyncOperation.STATUS_DONE
+    assert first.claimed_until is None
+    claimed = claim_pending_operations()
+    assert list(claimed) == [1]
+    assert claimed[1].pk == second.pk
+    other.refresh_from_db()
+    assert other.status == OrderSyncOperation.STATUS_DONE
+
+
+def test_superseded_operation_stays_superseded():
+    operation = OrderSyncOperation.objects.create(order_id=1, payload={})
+    claimed = claim_pending_operations()[1]
+    # The claim timed out and another worker superseded the operation.
+    OrderSyncOperation.objects.filter(pk=operation.pk).update(
+        status=OrderSyncOperation.STATUS_SUPERSEDED)
+
+    assert not record_operation_result(claimed, None, max_attempts=8)
+    operation.refresh_from_db()
+    assert operation.status == OrderSyncOperation.STATUS_SUPERSEDED
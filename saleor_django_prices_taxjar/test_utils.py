@@ -0,0 +1,40 @@
+import pytest
+
+from django.core.cache import caches
+
+from django_prices_taxjar.models import TaxCategories
+
+from .utils import (
+    TAX_RATE_TYPES_VERSION_KEY, clear_tax_rate_types_cache,
+    get_tax_rate_type_name)
+
+pytestmark = pytest.mark.django_db
+
+
+def set_category_name(name):
+    # Saved by another process, so without this process's signals.
+    TaxCategories.objects.all().update(
+        types=[{'product_tax_code': '20010', 'name': name}])
+
+
+@pytest.fixture
+def tax_categories():
+    TaxCategories.objects.create(
+        types=[{'product_tax_code': '20010', 'name': 'Clothing'}])
+    clear_tax_rate_types_cache()
+
+
+def test_tax_rate_types_reload_on_new_version(tax_categories):
+    assert get_tax_rate_type_name('20010') == 'Clothing'
+    set_category_name('Apparel')
+    assert get_tax_rate_type_name('20010') == 'Clothing'
+
+    caches['default'].set(TAX_RATE_TYPES_VERSION_KEY, 'other')
+    assert get_tax_rate_type_name('20010') == 'Apparel'
+
+
+def test_tax_rate_types_expire(settings, tax_categories):
+    settings.TAXJAR_TAX_RATE_TYPES_TTL = 0
+    assert get_tax_rate_type_name('20010') == 'Clothing'
+    set_category_name('Apparel')
+    assert get_tax_rate_type_name('20010') == 'Apparel'
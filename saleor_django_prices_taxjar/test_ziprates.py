@@ -0,0 +1,52 @@
+from decimal import Decimal
+
+from .ziprates import RATE_SCALE, ZipRateTable, normalize_postal_code
+
+
+def make_table(rates):
+    return ZipRateTable(
+        (normalize_postal_code(country, code), int(Decimal(rate) * RATE_SCALE))
+        for country, code, rate in rates)
+
+
+def test_exact_match():
+    table = make_table([('US', '90002', '0.1025'), ('US', '90003', '0.095')])
+    assert table.get_rate('US', '90002') == Decimal('0.1025')
+    assert table.get_rate('US', '90003') == Decimal('0.095')
+
+
+def test_us_zip_plus_four():
+    table = make_table([('US', '90002', '0.1025')])
+    assert table.get_rate('US', '90002-1234') == Decimal('0.1025')
+
+
+def test_longest_prefix_match():
+    table = make_table([
+        ('CA', 'K1A', '0.13'), ('CA', 'K1A0B1', '0.05'), ('CA', 'V', '0.12')])
+    assert table.get_rate('CA', 'K1A 0B1') == Decimal('0.05')
+    assert table.get_rate('CA', 'k1a 0a6') == Decimal('0.13')
+    assert table.get_rate('CA', 'V6B 1A1') == Decimal('0.12')
+
+
+def test_unknown_postal_code():
+    table = make_table([('US', '90002', '0.1025'), ('CA', 'K1A', '0.13')])
+    assert table.get_rate('US', '10001') is None
+    assert table.get_rate('CA', 'M5V 2T6') is None
+    # Prefixes don't cross countries.
+    assert table.get_rate('GB', 'K1A 0B1') is None
+    assert table.get_rate('US', '') is None
+
+
+def test_from_csv(tmpdir):
+    path = tmpdir.join('rates.csv')
+    path.write(
+        'ZipCode,EstimatedCombinedRate\n'
+        '90002,0.102500\n'
+        '10001,0.088750\n')
+    table = ZipRateTable.from_csv(str(path))
+    assert len(table) == 2
+    assert table.get_rate('US', '10001') == Decimal('0.08875')
+
+    path.write('country,postal_code,rate\nCA,K1A,0.13\n')
+    table = ZipRateTable.from_csv(str(path))
+    assert table.get_rate('CA', 'K1A 0B1') == Decimal('0.13')
@@ -0,0 +1,45 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from prices import Money, TaxedMoney
+
+from saleor.product.models import Product, ProductVariant
+
+# Helpers shared by the tests and the benchmarks.
+
+FAKE_API_URL = 'https://api.taxjar.com'
+
+
+def count_queries(func):
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    return len(queries)
+
+
+def create_variants(product, count):
+    return ProductVariant.objects.bulk_create([
+        ProductVariant(
+            product=product, sku='benchmark-%d' % (i,), quantity=count * 10)
+        for i in range(count)])
+
+
+def create_products(product, count):
+    """Return `count` copies of `product`, each with a variant."""
+    products = []
+    for i in range(count):
+        copy = Product.objects.get(pk=product.pk)
+        copy.pk = None
+        copy.save()
+        copy.variants.create(sku='copy-%d' % (copy.pk,), quantity=10)
+        products.append(copy)
+    return products
+
+
+def add_order_lines(order, variants):
+    price = TaxedMoney(net=Money(10, 'USD'), gross=Money(10, 'USD'))
+    order.lines.bulk_create([
+        order.lines.model(
+            order=order, product_name=str(variant.product),
+            product_sku=variant.sku, is_shipping_required=False,
+            quantity=1, variant=variant, unit_price=price, tax_rate=0)
+        for variant in variants])
@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from django.conf import settings
+
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_RESET_TIMEOUT = 30
+
+
+def get_timeout():
+    """Return the (connect, read) timeout for TaxJar requests."""
+    return (
+        getattr(settings, 'TAXJAR_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT),
+        getattr(settings, 'TAXJAR_READ_TIMEOUT', DEFAULT_READ_TIMEOUT))
+
+
+class TimeoutSession(requests.Session):
+    """Session applying the TaxJar timeouts to requests that set none."""
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = get_timeout()
+        return super(TimeoutSession, self).request(method, url, **kwargs)
+
+
+def create_session():
+    pool_size = getattr(settings, 'TAXJAR_POOL_SIZE', DEFAULT_POOL_SIZE)
+    session = TimeoutSession()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class SharedSession(object):
+    """
+    Proxy to a keep-alive session private to the current process.
+
+    The session is created on first use after a fork, so prefork workers
+    never share sockets. Attributes other than the request methods fall
+    through to the `requests` module, so this can stand in for it.
+
+    """
+    def __init__(self):
+        self._pid = None
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._session = create_session()
+                    self._pid = pid
+        return self._session
+
+    def request(self, method, url, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return self.session.post(url, data=data, json=json, **kwargs)
+
+    def put(self, url, data=None, **kwargs):
+        return self.session.put(url, data=data, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.session.delete(url, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+
+shared_session = SharedSession()
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling TaxJar while the circuit is open."""
+
+
+def is_outage(error):
+    """
+    Return whether `error` means TaxJar is unreachable or failing.
+
+    Errors about a single request, such as a 4xx for an invalid address,
+    say nothing about TaxJar's health.
+    """
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status is not None and status >= 500
+
+
+class CircuitBreaker(object):
+    """
+    Stop calling TaxJar after repeated failures.
+
+    After `threshold` consecutive outages (see `is_outage`) calls fail fast
+    with `CircuitOpenError` for `reset_timeout` seconds, then a single trial
+    call is let through to decide whether to close the circuit again.
+
+    """
+    def __init__(self, threshold=DEFAULT_BREAKER_THRESHOLD,
+                 reset_timeout=DEFAULT_BREAKER_RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return (self.opened_at is not None and
+                time.monotonic() - self.opened_at < self.reset_timeout)
+
+    def allow(self):
+        """
+        Return whether a call may be made now.
+
+        Once `reset_timeout` has passed this lets a single trial call
+        through, failing others fast until its outcome is recorded.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.opened_at = time.monotonic()
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+    def call(self, func, *args, **kwargs):
+        if not self.allow():
+            raise CircuitOpenError('TaxJar circuit is open')
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if is_outage(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+
+breaker = CircuitBreaker(
+    threshold=getattr(
+        settings, 'TAXJAR_BREAKER_THRESHOLD', DEFAULT_BREAKER_THRESHOLD),
+    reset_timeout=getattr(
+        settings, 'TAXJAR_BREAKER_RESET_TIMEOUT',
+        DEFAULT_BREAKER_RESET_TIMEOUT))
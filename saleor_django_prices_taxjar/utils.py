@@ -1,93 +1,414 @@
-from geolite2 import geolite2
+import logging
+import time
+import uuid
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal
+
+from requests import RequestException
 
 from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Case, Value, When
 
-from prices import Money
-from django_prices_taxjar import LineItem, DEFAULT_TAXJAR_PRODUCT_TAX_CODE
+from prices import Money, TaxedMoney, flat_tax
+from django_prices_taxjar import DEFAULT_TAXJAR_PRODUCT_TAX_CODE
 from django_prices_taxjar.models import TaxCategories
-from django_prices_taxjar.utils import (
-    get_taxes_for_order, get_tax_rates_for_region, get_tax_rate,
-    get_tax_for_rate)
+from django_prices_taxjar.utils import get_tax_rates_for_region
+
+from saleor.core.utils.taxes import DEFAULT_TAX_RATE_NAME, ZERO_TAXED_MONEY
+from saleor.discount.models import Sale
 
-from saleor.core.utils.taxes import DEFAULT_TAX_RATE_NAME
+from . import instrumentation
+from .cache import memoize_in_scope, quote_cache, rate_cache
+from .canonical import TaxRequest
+from .geoip import get_country_region_by_ip  # noqa: F401
+from .rates import (fetch_order_taxes, get_region_key, get_taxes_from_rates,
+                    rate_snapshot)
+from .transport import CircuitOpenError, breaker
+from .ziprates import get_zip_rate_table, should_estimate
 
-georeader = geolite2.reader()
+logger = logging.getLogger(__name__)
 
 ORDER_TAX_RATE = 'ORDER_TAX_RATE'
 
 ZERO_MONEY = Money(0, settings.DEFAULT_CURRENCY)
 
+MISSING = object()
+
+# Amount used to read the effective rate back out of a quoted tax function.
+RATE_PROBE_AMOUNT = Decimal(1000000)
+
+DEFAULT_TAX_RATE_TYPES_TTL = 5 * 60
+TAX_RATE_TYPES_VERSION_KEY = 'taxjar-tax-rate-types-version'
+
+
+class QuotedTax(object):
+    """
+    Flat tax at the effective rate of a TaxJar order quote.
+
+    Unlike the tax functions of `django_prices_taxjar`, this can be pickled,
+    so quotes can be shared between workers through a Django cache.
+
+    """
+    __slots__ = ('rate',)
+
+    def __init__(self, rate):
+        self.rate = rate
+
+    @classmethod
+    def from_tax(cls, tax):
+        probe = Money(RATE_PROBE_AMOUNT, settings.DEFAULT_CURRENCY)
+        taxed = tax(TaxedMoney(net=probe, gross=probe))
+        return cls(taxed.tax.amount / RATE_PROBE_AMOUNT)
+
+    @classmethod
+    def from_response(cls, tax):
+        """Return the quote for the `tax` of a TaxJar taxes response."""
+        total = Decimal(str(tax.get('order_total_amount') or 0))
+        if not total:
+            return cls(Decimal(0))
+        return cls(Decimal(str(tax.get('amount_to_collect') or 0)) / total)
+
+    def __call__(self, base, keep_gross=False):
+        return flat_tax(base, self.rate, keep_gross=keep_gross)
+
+    def __eq__(self, other):
+        return isinstance(other, QuotedTax) and self.rate == other.rate
+
+    def __hash__(self):
+        return hash(self.rate)
+
+    def __repr__(self):
+        return 'QuotedTax(%r)' % (self.rate,)
+
+
+def select_line_products(lines):
+    """
+    Fetch the variant, product and category of every line in `lines`.
+
+    Product collections are prefetched in one more query. Evaluating sales
+    reads both the category and the collections.
+    """
+    return lines.select_related('variant__product__category').prefetch_related(
+        'variant__product__collections')
+
+
+def get_active_discounts():
+    """
+    Return today's sales, as Saleor's `discounts` middleware sets them.
 
-def get_country_region_by_ip(ip_address):
-    geo_data = georeader.get(ip_address)
-    if (geo_data and 'subdivisions' in geo_data and
-            len(geo_data['subdivisions']) and
-            'iso_code' in geo_data['subdivisions'][0] and
-            'country' in geo_data and
-            'iso_code' in geo_data['country']):
-        return (geo_data['country']['iso_code'],
-                geo_data['subdivisions'][0]['iso_code'])
-    return (None, None)
-
-
-def get_taxes_for_cart_full(cart, shipping_cost, discounts, default_taxes):
-    country = cart.shipping_address.country.code
-    postal_code = cart.shipping_address.postal_code
-    region_code = cart.shipping_address.country_area
-    city = cart.shipping_address.city
-    street = cart.shipping_address.street_address_1
-    kwargs = {}
+    Quotes computed outside a request must use the same sales, or their
+    line items, and so their cache keys, differ from the request's.
+    """
+    return Sale.objects.active(date.today()).prefetch_related(
+        'products', 'categories', 'collections')
+
+
+def get_line_items(cart, discounts, lines=None):
+    """
+    Return the `LineItem` arguments for every line of a cart or order.
+
+    Lines are fetched with `select_line_products`, unless `lines` fetched
+    that way are given, and discounted prices are computed once per product
+    and base price, so the number of queries doesn't grow with the number
+    of lines.
+    """
+    if discounts is not None:
+        discounts = list(discounts)
+    if lines is None:
+        lines = select_line_products(
+            cart.lines.filter(variant__isnull=False))
+    discounted = {}
+    line_items = []
+    for line in lines:
+        if line.variant_id is None:
+            continue
+        variant = line.variant
+        product = variant.product
+        base_price = variant.base_price
+        key = (product.pk, base_price.amount)
+        if key not in discounted:
+            discounted[key] = (
+                base_price - variant.get_price(discounts, []).gross)
+        tax_code = (
+            product.tax_rate if product.tax_rate != DEFAULT_TAX_RATE_NAME
+            else DEFAULT_TAXJAR_PRODUCT_TAX_CODE)
+        line_items.append((
+            variant.pk, line.quantity, base_price, tax_code, discounted[key]))
+    return line_items
+
+
+def get_estimated_tax(address):
+    """Return a tax from the local ZIP rate table, or None if unknown."""
+    table = get_zip_rate_table()
+    if table is None:
+        return None
+    rate = table.get_rate(address.country.code, address.postal_code)
+    if rate is None:
+        return None
+    return QuotedTax(rate)
+
+
+def get_taxes_for_cart_full(cart, shipping_cost, discounts, default_taxes,
+                            call_site=None, lines=None):
+    """
+    Return the tax for a cart or order as a whole.
+
+    If `call_site` is listed in `TAXJAR_ESTIMATE_CALL_SITES`, the tax is
+    estimated from the local ZIP rate table when it has the postal code.
+    Metrics are tagged with `call_site`, or the one set by the caller.
+    `lines` fetched with `select_line_products` can be passed to avoid
+    fetching them again.
+    """
+    call_site = call_site or instrumentation.get_call_site()
+    with instrumentation.call_site(call_site), \
+            instrumentation.timer('cart_taxes') as tags:
+        if should_estimate(call_site):
+            tax = get_estimated_tax(cart.shipping_address)
+            if tax is not None:
+                tags['source'] = 'estimate'
+                return tax
+        tags['source'] = 'quote'
+        return _get_taxes_for_cart_full(
+            cart, shipping_cost, discounts, tags, lines)
+
+
+def get_cart_tax_items(cart, discounts, lines=None):
+    """
+    Return the amount and line items to quote taxes for.
+
+    One of them is None, depending on `DJANGO_PRICES_TAXJAR_USE_LINE_ITEMS`.
+    """
     if getattr(settings, 'DJANGO_PRICES_TAXJAR_USE_LINE_ITEMS', True):
-        if len(list(cart)):
-            kwargs['line_items'] = map(lambda line: LineItem(
-                line.variant.id,
-                line.quantity,
-                line.variant.base_price,
-                (line.variant.product.tax_rate
-                    if line.variant.product.tax_rate != DEFAULT_TAX_RATE_NAME
-                 else DEFAULT_TAXJAR_PRODUCT_TAX_CODE),
-                (line.variant.base_price - line.variant.get_price(
-                    discounts, []).gross)), cart)
-        else:
-            kwargs['amount'] = ZERO_MONEY
-    else:
-        try:
-            kwargs['amount'] = cart.get_subtotal(
-                discounts, None).gross - cart.discount_amount
-
-        # This can potentially throw a TypeError because the function
-        # signature is different.
-        except TypeError:
-            kwargs['amount'] = cart.get_subtotal().gross - cart.discount_amount
-
-    tax = get_taxes_for_order(
-        shipping_cost.gross, country, postal_code, region_code, city, street,
-        **kwargs)
-    return tax
+        line_items = get_line_items(cart, discounts, lines)
+        if line_items:
+            return None, line_items
+        return ZERO_MONEY, None
+    try:
+        amount = cart.get_subtotal(
+            discounts, None).gross - cart.discount_amount
+
+    # This can potentially throw a TypeError because the function
+    # signature is different.
+    except TypeError:
+        amount = cart.get_subtotal().gross - cart.discount_amount
+    return amount, None
+
+
+def get_cart_quote_request(cart, shipping_cost, discounts, lines=None):
+    """
+    Return the cache key of a cart's order quote and a function fetching it.
+    """
+    address = cart.shipping_address
+    amount, line_items = get_cart_tax_items(cart, discounts, lines)
+
+    tax_request = TaxRequest.build(
+        address, shipping_cost.gross, amount=amount, line_items=line_items)
+
+    def fetch_quote():
+        with instrumentation.timer('taxjar_request', endpoint='taxes'):
+            tax = breaker.call(
+                fetch_order_taxes, tax_request.to_api_payload())
+        return QuotedTax.from_response(tax)
+
+    return tax_request.fingerprint(), fetch_quote
+
+
+def _get_taxes_for_cart_full(cart, shipping_cost, discounts, tags, lines):
+    address = cart.shipping_address
+    key, fetch_quote = get_cart_quote_request(
+        cart, shipping_cost, discounts, lines)
+    try:
+        return memoize_in_scope(
+            ('order', key), lambda: quote_cache.get_or_set(key, fetch_quote))
+    except (CircuitOpenError, RequestException) as e:
+        logger.warning('TaxJar order quote failed, using region rates: %r', e)
+        tags['source'] = 'fallback'
+        return get_fallback_tax(address)
+
+
+CartTotals = namedtuple(
+    'CartTotals', ['subtotal', 'discount', 'shipping', 'tax', 'total'])
+
+CART_TOTALS_ATTR = '_taxjar_totals'
+
+
+def _get_cart_signature(cart):
+    return (
+        cart.pk, cart.quantity, getattr(cart, 'last_change', None),
+        cart.discount_amount, cart.voucher_code, cart.shipping_address_id,
+        cart.shipping_method_id)
+
+
+def get_totals_breakdown(cart, discounts=None):
+    """
+    Return the subtotal, discount, shipping, tax and total of a cart.
+
+    The lines are fetched and priced once and the tax comes from a single
+    quote. The result is kept on the cart until the cart or its lines
+    change, or different discounts are passed.
+    """
+    signature = _get_cart_signature(cart)
+    cached = cart.__dict__.get(CART_TOTALS_ATTR)
+    if (cached is not None and cached[0] == signature and
+            cached[1] is discounts):
+        return cached[2]
+
+    line_discounts = list(discounts) if discounts is not None else None
+    lines = list(select_line_products(cart.lines.all()))
+    subtotal = sum(
+        [line.get_total(line_discounts, None) for line in lines],
+        ZERO_TAXED_MONEY)
+    shipping = cart.get_shipping_price(None)
+    total = subtotal + shipping - cart.discount_amount
+    if cart.shipping_address and lines:
+        tax = get_taxes_for_cart_full(
+            cart, shipping, line_discounts, None, call_site='cart_total',
+            lines=lines)
+        total = tax(total)
+    totals = CartTotals(
+        subtotal=subtotal, discount=cart.discount_amount, shipping=shipping,
+        tax=total.tax, total=total)
+    cart.__dict__[CART_TOTALS_ATTR] = (signature, discounts, totals)
+    return totals
+
+
+def clear_cart_totals(sender, instance, **kwargs):
+    """Forget the memoized totals of a saved or deleted cart line's cart."""
+    if sender.cart.is_cached(instance):
+        instance.cart.__dict__.pop(CART_TOTALS_ATTR, None)
+
+
+def get_fallback_tax(address):
+    """Return the summary rate for the address when quotes are unavailable."""
+    taxes = get_taxes_for_country_region(
+        address.country, address.country_area)
+    if taxes is None:
+        return QuotedTax(Decimal(0))
+    return QuotedTax.from_tax(taxes[DEFAULT_TAX_RATE_NAME]['tax'])
 
 
 def get_taxes_for_country_region(country, region=None):
-    if (country.code != 'CA' and country.code != 'US'):
-        # TaxJar only has summaries with regions for CA and US.
-        region = None
-    tax_rates = get_tax_rates_for_region(country.code, region)
+    with instrumentation.timer('region_taxes') as tags:
+        country_code, region = get_region_key(country.code, region)
+        if getattr(settings, 'TAXJAR_RATE_SNAPSHOT', False):
+            taxes = rate_snapshot.get(country_code, region, default=MISSING)
+            if taxes is not MISSING:
+                tags['source'] = 'snapshot'
+                return taxes
+        tags['source'] = 'lookup'
+        return memoize_in_scope(
+            ('region', country_code, region),
+            lambda: _get_taxes_for_country_region(country_code, region))
+
+
+def get_rate_cache_key(country_code, region):
+    return '%s:%s' % (country_code, region or '')
+
+
+def _get_taxes_for_country_region(country_code, region):
+    tax_rates = rate_cache.get_or_set(
+        get_rate_cache_key(country_code, region),
+        lambda: get_tax_rates_for_region(country_code, region))
     if tax_rates is None:
         return None
+    return get_taxes_from_rates(tax_rates)
 
-    taxes = {
-        DEFAULT_TAX_RATE_NAME: {
-            'value': get_tax_rate(tax_rates),
-            'tax': get_tax_for_rate(tax_rates),
-        }
-    }
 
-    return taxes
+def bulk_update_fields(objs, fields):
+    """
+    Save `fields` of every object in `objs` with a single UPDATE query.
 
+    This mirrors `QuerySet.bulk_update`, which isn't available before
+    Django 2.2.
+    """
+    if not objs:
+        return
+    model = type(objs[0])
+    updates = {}
+    for name in fields:
+        field = model._meta.get_field(name)
+        updates[field.attname] = Case(*[
+            When(pk=obj.pk, then=Value(
+                getattr(obj, field.attname), output_field=field))
+            for obj in objs], output_field=field)
+    model._default_manager.filter(
+        pk__in=[obj.pk for obj in objs]).update(**updates)
 
-def get_tax_rate_types():
+
+# (version, expiry, (types, choices, names)) of the categories last loaded.
+_tax_rate_types = None
+
+
+def _get_tax_rate_types_backend():
+    return caches[getattr(
+        settings, 'TAXJAR_TAX_RATE_TYPES_CACHE_ALIAS', 'default')]
+
+
+def _get_tax_rate_types_version():
+    """Return the categories version shared by all processes."""
+    return memoize_in_scope(
+        ('tax_rate_types_version',),
+        lambda: _get_tax_rate_types_backend().get(
+            TAX_RATE_TYPES_VERSION_KEY))
+
+
+def _bump_tax_rate_types_version():
+    _get_tax_rate_types_backend().set(
+        TAX_RATE_TYPES_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def _get_cached_tax_rate_types():
+    """
+    Return the categories loaded by this process.
+
+    They are loaded again when another process changed them, which it
+    announces with a new version in a shared Django cache, or after
+    `TAXJAR_TAX_RATE_TYPES_TTL` seconds, in case the cache isn't shared.
+    """
+    global _tax_rate_types
+    version = _get_tax_rate_types_version()
+    cached = _tax_rate_types
+    now = time.monotonic()
+    if cached is not None and cached[0] == version and cached[1] > now:
+        return cached[2]
     categories = TaxCategories.objects.singleton()
+    types = []
     if categories:
-        return list(map(
-            lambda category: (category['product_tax_code'], category['name']),
-            categories.types))
-    return []
+        types = [
+            (category['product_tax_code'], category['name'])
+            for category in categories.types]
+    choices = tuple(sorted([('', '')] + types, key=lambda x: x[0]))
+    result = (tuple(types), choices, dict(types))
+    ttl = getattr(
+        settings, 'TAXJAR_TAX_RATE_TYPES_TTL', DEFAULT_TAX_RATE_TYPES_TTL)
+    _tax_rate_types = (version, now + ttl, result)
+    return result
+
+
+def get_tax_rate_types():
+    return list(_get_cached_tax_rate_types()[0])
+
+
+def get_tax_rate_type_choices():
+    """Return the sorted tax category choices, including a blank one."""
+    return list(_get_cached_tax_rate_types()[1])
+
+
+def get_tax_rate_type_name(product_tax_code, default=None):
+    """Return the name of the TaxJar category with `product_tax_code`."""
+    return _get_cached_tax_rate_types()[2].get(product_tax_code, default)
+
+
+def clear_tax_rate_types_cache(*args, **kwargs):
+    """
+    Forget the cached categories; connected to `TaxCategories` signals.
+
+    Other processes are told once the change is committed, so that they
+    don't load the categories before it.
+    """
+    global _tax_rate_types
+    _tax_rate_types = None
+    transaction.on_commit(_bump_tax_rate_types_version)
@@ -0,0 +1,42 @@
+import logging
+
+from django.conf import settings
+
+from . import geoip
+from .cache import rate_cache
+from .rates import fetch_summary_rates, get_region_key, rate_snapshot
+from .utils import get_rate_cache_key
+from .ziprates import get_zip_rate_table
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up_rates():
+    """Fill the rate cache with TaxJar's summary rates in one request."""
+    summary_rates = fetch_summary_rates()
+    for tax_rates in summary_rates:
+        key = get_region_key(
+            tax_rates['country_code'], tax_rates.get('region_code'))
+        rate_cache.set(get_rate_cache_key(*key), tax_rates)
+    return len(summary_rates)
+
+
+def warm_up():
+    """
+    Load rates, the ZIP rate table and the GeoIP database.
+
+    Called from `ready` when `TAXJAR_WARM_UP` is set, so that with a
+    preloading server like `gunicorn --preload` the work is done once in the
+    master and every forked worker starts hot. Failures are logged and
+    leave the caches to be filled on demand.
+    """
+    steps = [warm_up_rates, get_zip_rate_table]
+    if getattr(settings, 'TAXJAR_RATE_SNAPSHOT', False):
+        steps.append(rate_snapshot.refresh)
+    if getattr(settings, 'TAXJAR_GEOIP_MODE', None):
+        steps.append(geoip.get_reader)
+    for step in steps:
+        try:
+            step()
+        except Exception:
+            logger.exception('TaxJar warm-up step %s failed', step.__name__)
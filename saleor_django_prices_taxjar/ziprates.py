@@ -0,0 +1,98 @@
+import csv
+import threading
+from array import array
+from bisect import bisect_left
+from decimal import Decimal
+
+from django.conf import settings
+
+
+# Rates are stored as integer millionths to keep the table compact.
+RATE_SCALE = 1000000
+
+POSTAL_CODE_COLUMNS = ('postal_code', 'ZipCode')
+RATE_COLUMNS = ('rate', 'EstimatedCombinedRate')
+
+
+def normalize_postal_code(country_code, postal_code):
+    postal_code = postal_code.replace(' ', '').replace('-', '').upper()
+    if country_code == 'US':
+        postal_code = postal_code[:5]
+    return '%s:%s' % (country_code, postal_code)
+
+
+def _get_column(row, names):
+    for name in names:
+        if row.get(name):
+            return row[name]
+    raise KeyError('CSV row has none of the columns %s' % (names,))
+
+
+class ZipRateTable(object):
+    """
+    Combined sales tax rates by postal code, looked up by binary search.
+
+    Postal codes are kept in a sorted tuple next to an array of rates. A code
+    without an exact entry matches the longest prefix in the table, so
+    Canadian rates can be listed by forward sortation area.
+
+    """
+    def __init__(self, rows=()):
+        rows = sorted(rows)
+        self.keys = tuple(key for key, rate in rows)
+        self.rates = array('l', (rate for key, rate in rows))
+
+    @classmethod
+    def from_csv(cls, path, default_country='US'):
+        """
+        Load a CSV with postal code and rate columns.
+
+        Columns are `country`, `postal_code` and `rate`, or `ZipCode` and
+        `EstimatedCombinedRate` as in Avalara's free ZIP code tables.
+        """
+        rows = {}
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                key = normalize_postal_code(
+                    row.get('country') or default_country,
+                    _get_column(row, POSTAL_CODE_COLUMNS))
+                rate = Decimal(_get_column(row, RATE_COLUMNS))
+                rows[key] = int(rate * RATE_SCALE)
+        return cls(rows.items())
+
+    def get_rate(self, country_code, postal_code):
+        """Return the rate as a Decimal fraction, or None if unknown."""
+        if not postal_code:
+            return None
+        key = normalize_postal_code(country_code, postal_code)
+        for end in range(len(key), len(country_code) + 1, -1):
+            prefix = key[:end]
+            index = bisect_left(self.keys, prefix)
+            if index < len(self.keys) and self.keys[index] == prefix:
+                return Decimal(self.rates[index]) / RATE_SCALE
+        return None
+
+    def __len__(self):
+        return len(self.keys)
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_zip_rate_table():
+    """Return the table from `TAXJAR_ZIP_RATES_FILE`, loading it once."""
+    global _table
+    path = getattr(settings, 'TAXJAR_ZIP_RATES_FILE', None)
+    if not path:
+        return None
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                _table = ZipRateTable.from_csv(path)
+    return _table
+
+
+def should_estimate(call_site):
+    """Return whether taxes for `call_site` may use the local table."""
+    return call_site in getattr(settings, 'TAXJAR_ESTIMATE_CALL_SITES', ())